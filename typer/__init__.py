@@ -1,2 +1,5 @@
 import typer.typecheck
-from typer.typecheck import *
\ No newline at end of file
+from typer.typecheck import *
+from typer.typecheck.decision_tree import decision_tree
+from typer.api import check, Result
+from typer.limits import CheckLimits
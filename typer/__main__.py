@@ -1,34 +1,133 @@
+import argparse
+import json
 import sys
 
-from antlr4 import InputStream, CommonTokenStream
-from typer.grammar.stellaLexer import stellaLexer
-from typer.grammar.stellaParser import stellaParser
+from typer.api import check
+from typer.limits import CheckLimits
+from typer.lsp import serve as serve_lsp
+from typer.regression import run_tests
+from typer.report import REPORTERS, check_file
+from typer.runtime import compile_program
+from typer.runtime.batch import read_inputs, run_inputs
+from typer.service import ServiceConfig, serve
 
-from typer.typecheck.infer_types import infer_types
-from typer.typecheck.type_error import StellaTypeError
 
+def check_program_types(program_source: str) -> bool:
+    result = check(program_source)
+    if not result.ok:
+        print(result.message)
+    return result.ok
 
-def check_program_types(program_source: str):
-    input_stream = InputStream(program_source)
-    lexer = stellaLexer(input_stream)
-    token_stream = CommonTokenStream(lexer)
-    parser = stellaParser(token_stream)
 
-    try:
-        infer_types(parser.program())
-    except StellaTypeError as e:
-        print(e.message)
-        return False
+def add_limit_arguments(arg_parser: argparse.ArgumentParser):
+    limits = arg_parser.add_argument_group("limits", "a check going over a limit gets the limit_exceeded verdict")
+    limits.add_argument("--max-seconds", type=float, help="wall time of a single check")
+    limits.add_argument("--max-nodes", type=int, help="nodes in the syntax tree")
+    limits.add_argument("--max-depth", type=int, help="nesting depth of the syntax tree")
+    limits.add_argument("--max-memory-mb", type=int, help="resident memory of the checking process")
 
 
-def main(*args, **kwargs):
-    if len(sys.argv) < 2:
-        raise RuntimeError("Usage: typer <file_name>")
+def check_limits(options: argparse.Namespace) -> CheckLimits | None:
+    limits = CheckLimits(wall_time=options.max_seconds, max_nodes=options.max_nodes, max_depth=options.max_depth,
+                         max_memory=options.max_memory_mb << 20 if options.max_memory_mb is not None else None)
+    return limits if limits != CheckLimits() else None
 
-    file_path = sys.argv[1]
-    with open(file_path, "r") as f:
-        return check_program_types(f.read())
+
+def check_command(argv: list[str]) -> int:
+    arg_parser = argparse.ArgumentParser(prog="typer")
+    arg_parser.add_argument("files", nargs="+", metavar="file_name")
+    arg_parser.add_argument("--format", choices=REPORTERS.keys(), default="text")
+    add_limit_arguments(arg_parser)
+    options = arg_parser.parse_args(argv)
+
+    limits = check_limits(options)
+    reporter = REPORTERS[options.format]()
+    all_ok = True
+    for file_path in options.files:
+        record = check_file(file_path, limits)
+        all_ok = all_ok and record["verdict"] == "ok"
+        reporter.report(record)
+    reporter.finish()
+    return 0 if all_ok else 1
+
+
+def run_command(argv: list[str]) -> int:
+    arg_parser = argparse.ArgumentParser(prog="typer run")
+    arg_parser.add_argument("file", metavar="file_name")
+    arg_parser.add_argument("inputs", nargs="*", metavar="input", help="Stella expression passed to main")
+    arg_parser.add_argument("--inputs", dest="inputs_file", metavar="inputs.jsonl",
+                            help="JSON Lines file of inputs; results are streamed as JSON Lines")
+    arg_parser.add_argument("--jobs", type=int, default=1, help="worker processes evaluating the inputs")
+    options = arg_parser.parse_args(argv)
+    if not options.inputs and options.inputs_file is None:
+        arg_parser.error("no inputs given")
+
+    with open(options.file) as source_file:
+        source = source_file.read()
+    result = check(source)
+    if not result.ok:
+        print(result.message)
+        return 1
+
+    program = compile_program(result.program)
+    all_ok = True
+    if options.inputs_file is not None:
+        for record in run_inputs(program, source, read_inputs(options.inputs_file), options.jobs):
+            all_ok = all_ok and record["verdict"] == "ok"
+            print(json.dumps(record), flush=True)
+    for record in run_inputs(program, source, options.inputs, options.jobs):
+        all_ok = all_ok and record["verdict"] == "ok"
+        if record["verdict"] == "ok":
+            print(record["output"])
+        elif record["verdict"] == "error":
+            print(f"{record['input']}: {record['message']}")
+        elif record["verdict"] == "runtime_error":
+            print(f"{record['input']}: runtime error: {record['message']}")
+        else:
+            print(f"{record['input']}: internal error: {record['message']}")
+    return 0 if all_ok else 1
+
+
+def lsp_command(argv: list[str]) -> int:
+    argparse.ArgumentParser(prog="typer lsp", description="Language server over stdio").parse_args(argv)
+    return serve_lsp()
+
+
+def serve_command(argv: list[str]) -> int:
+    arg_parser = argparse.ArgumentParser(prog="typer serve", description="HTTP checking service")
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--workers", type=int, default=2, help="worker processes checking programs")
+    arg_parser.add_argument("--max-request-bytes", type=int, default=1 << 20)
+    arg_parser.add_argument("--timeout", type=float, default=10.0, help="seconds a single check may take")
+    arg_parser.add_argument("--queue-size", type=int, default=64,
+                            help="requests that may wait for a worker before new ones get 429")
+    add_limit_arguments(arg_parser)
+    options = arg_parser.parse_args(argv)
+    config = ServiceConfig(workers=options.workers, max_request_bytes=options.max_request_bytes,
+                           check_timeout=options.timeout, queue_size=options.queue_size,
+                           limits=check_limits(options))
+    return serve(options.host, options.port, config)
+
+
+def test_command(argv: list[str]) -> int:
+    arg_parser = argparse.ArgumentParser(prog="typer test", description="Check a corpus against expected verdicts")
+    arg_parser.add_argument("directory", help="tree with well-typed/ and ill-typed/ERROR_XXX/ directories")
+    arg_parser.add_argument("--jobs", type=int, default=None, help="worker processes (default: one per CPU)")
+    arg_parser.add_argument("--failures-only", action="store_true", help="print only failing files")
+    options = arg_parser.parse_args(argv)
+    return 0 if run_tests(options.directory, options.jobs, failures_only=options.failures_only) else 1
+
+
+COMMANDS = {"run": run_command, "lsp": lsp_command, "serve": serve_command, "test": test_command}
+
+
+def main(argv: list[str] | None = None) -> int:
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] in COMMANDS:
+        return COMMANDS[argv[0]](argv[1:])
+    return check_command(argv)
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import time
+
+from dataclasses import dataclass, field
+
+from antlr4 import InputStream, CommonTokenStream, PredictionMode, Token
+from antlr4.error.ErrorListener import ErrorListener
+from antlr4.error.ErrorStrategy import BailErrorStrategy
+from antlr4.error.Errors import ParseCancellationException
+from typer.grammar.stellaLexer import stellaLexer
+from typer.grammar.stellaParser import stellaParser
+
+from typer.limits import Budget, CheckLimits, LimitedLexer, LimitedParser, LimitedTokenStream, LimitExceededError, \
+    activate_budget
+from typer.typecheck.infer_types import infer_types
+from typer.typecheck.type_error import StellaTypeError, ParseError, Span
+
+
+@dataclass
+class Result:
+    ok: bool
+    error_code: str | None = None
+    message: str | None = None
+    span: Span | None = None
+    warnings: list[StellaTypeError] = field(default_factory=list)
+    timings: dict = field(default_factory=dict)
+    program: stellaParser.ProgramContext | None = field(default=None, repr=False)
+    limit_exceeded: bool = False
+    internal_error: bool = False
+
+    @property
+    def verdict(self) -> str:
+        if self.limit_exceeded:
+            return "limit_exceeded"
+        if self.internal_error:
+            return "internal_error"
+        return "ok" if self.ok else "error"
+
+
+class _RaiseParseError(ErrorListener):
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        length = len(offendingSymbol.text) if offendingSymbol is not None and offendingSymbol.type != Token.EOF else 1
+        raise ParseError(line, column, msg, length)
+
+
+class _ReportAndBail(BailErrorStrategy):
+    # Words the first error the way ANTLR would, then gives up instead of recovering
+    def recover(self, recognizer, e):
+        self.reportError(recognizer, e)
+        super().recover(recognizer, e)
+
+
+def parse_program(source: str, budget: Budget | None = None) -> stellaParser.ProgramContext:
+    """Parses a program, raising ParseError at its first syntax error without recovering from it.
+
+    Most programs parse with SLL prediction alone, which is faster; only when it fails is the program parsed again
+    with full LL prediction, which either succeeds or finds the actual error."""
+    if budget is None:
+        lexer = stellaLexer(InputStream(source))
+        parser = stellaParser(CommonTokenStream(lexer))
+    else:
+        lexer = LimitedLexer(InputStream(source), budget)
+        parser = LimitedParser(LimitedTokenStream(lexer))
+    return _parse_whole(lexer, parser, stellaParser.program, "the program")
+
+
+def parse_expression(source: str) -> stellaParser.ExprContext:
+    """Parses a standalone expression the same way, such as an input passed to main."""
+    lexer = stellaLexer(InputStream(source))
+    return _parse_whole(lexer, stellaParser(CommonTokenStream(lexer)), stellaParser.expr, "the expression")
+
+
+def _parse_whole(lexer: stellaLexer, parser: stellaParser, rule, what: str):
+    lexer.removeErrorListeners()
+    lexer.addErrorListener(_RaiseParseError())
+    parser.removeErrorListeners()
+
+    parser._errHandler = BailErrorStrategy()
+    parser._interp.predictionMode = PredictionMode.SLL
+    try:
+        tree = rule(parser)
+    except ParseCancellationException:
+        parser.reset()
+        parser.addErrorListener(_RaiseParseError())
+        parser._errHandler = _ReportAndBail()
+        parser._interp.predictionMode = PredictionMode.LL
+        tree = rule(parser)
+
+    # Neither rule matches EOF, so input left over after a complete tree has to be looked for
+    extra = parser.getCurrentToken()
+    if extra.type != Token.EOF:
+        raise ParseError(extra.line, extra.column, f"extraneous input '{extra.text}' after {what}", len(extra.text))
+    return tree
+
+
+def check(source: str, record_types: bool = False, limits: CheckLimits | None = None) -> Result:
+    """Parses and type checks a program; a syntax error fails the check with ERROR_PARSE. With record_types,
+    result.program.type_index maps character offsets to the types of the expressions there, also for programs that
+    fail to check. With limits, a check that goes over one of them stops with the limit_exceeded verdict, as does one
+    nested too deeply for the interpreter's stack. Nothing is printed and nothing but a result comes back: a failure
+    of the checker itself has the internal_error verdict."""
+    budget = Budget(limits) if limits is not None else None
+    parse_started = time.perf_counter()
+    program = None
+    try:
+        with activate_budget(budget):
+            program = parse_program(source, budget)
+            check_started = time.perf_counter()
+            result = Result(ok=True, warnings=infer_types(program, record_types))
+    except StellaTypeError as e:
+        result = Result(ok=False, error_code=e.code, message=e.message, span=e.span)
+    except LimitExceededError as e:
+        result = Result(ok=False, error_code=e.code, message=e.message, limit_exceeded=True)
+    except RecursionError:
+        result = Result(ok=False, error_code="LIMIT_NESTING_DEPTH", limit_exceeded=True,
+                        message="LIMIT_NESTING_DEPTH\nthe program nests too deeply to be checked")
+    except Exception as e:
+        # A failure of the checker itself; the caller gets a result all the same
+        result = Result(ok=False, error_code=type(e).__name__, message=f"{type(e).__name__}: {e}", internal_error=True)
+    finished = time.perf_counter()
+    if program is None:
+        check_started = finished
+
+    result.program = program
+    result.timings = {
+        "parse_ms": _ms(check_started - parse_started),
+        "check_ms": _ms(finished - check_started),
+    }
+    return result
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
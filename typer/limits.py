@@ -0,0 +1,140 @@
+import os
+import resource
+import time
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import NamedTuple
+
+from antlr4 import CommonTokenStream
+
+from typer.grammar.stellaLexer import stellaLexer
+from typer.grammar.stellaParser import stellaParser
+
+
+class CheckLimits(NamedTuple):
+    """Budget of a single check; None leaves a resource unlimited."""
+    wall_time: float | None = None
+    max_nodes: int | None = None
+    max_depth: int | None = None
+    max_memory: int | None = None  # resident set size in bytes
+
+
+class LimitExceededError(Exception):
+    def __init__(self, code: str, message: str) -> None:
+        self.code = code
+        self.message = f"{code}\n{message}"
+
+
+# Wall time and memory are looked at once every this many steps
+_SAMPLE_EVERY = 256
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def resident_memory() -> int:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # Without /proc only the peak is known, in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if peak > 1 << 32 else peak * 1024
+
+
+class Budget:
+    """What remains of the limits of one check. Lexer, parser and checker call step() as they go, so a check that
+    runs out of time or memory stops there instead of running to completion."""
+
+    def __init__(self, limits: CheckLimits):
+        self.limits = limits
+        self.deadline = time.monotonic() + limits.wall_time if limits.wall_time is not None else None
+        self.steps = 0
+        self.nodes = 0
+        self.depth = 0
+
+    def step(self):
+        self.steps += 1
+        if self.steps % _SAMPLE_EVERY == 0:
+            if self.deadline is not None and time.monotonic() > self.deadline:
+                raise LimitExceededError("LIMIT_WALL_TIME", f"checking took longer than {self.limits.wall_time} s")
+            if self.limits.max_memory is not None and resident_memory() > self.limits.max_memory:
+                raise LimitExceededError("LIMIT_MEMORY", f"checking used more than {self.limits.max_memory} bytes")
+
+    def enter_node(self):
+        self.nodes += 1
+        self.depth += 1
+        if self.limits.max_nodes is not None and self.nodes > self.limits.max_nodes:
+            raise LimitExceededError("LIMIT_AST_NODES", f"the program has more than {self.limits.max_nodes} nodes")
+        if self.limits.max_depth is not None and self.depth > self.limits.max_depth:
+            raise LimitExceededError("LIMIT_NESTING_DEPTH", f"the program nests deeper than {self.limits.max_depth}")
+        self.step()
+
+    def exit_node(self):
+        self.depth -= 1
+
+
+_budget: ContextVar[Budget | None] = ContextVar("budget", default=None)
+
+
+def active_budget() -> Budget | None:
+    return _budget.get()
+
+
+@contextmanager
+def activate_budget(budget: Budget | None):
+    token = _budget.set(budget)
+    try:
+        yield budget
+    finally:
+        _budget.reset(token)
+
+
+class LimitedLexer(stellaLexer):
+    def __init__(self, input_stream, budget: Budget):
+        super().__init__(input_stream)
+        self.budget = budget
+
+    def nextToken(self):
+        self.budget.step()
+        return super().nextToken()
+
+
+class LimitedTokenStream(CommonTokenStream):
+    # Prediction walks ahead through the tokens too, so an ambiguous parse spends the budget as it goes
+    def __init__(self, lexer: LimitedLexer):
+        super().__init__(lexer)
+        self.budget = lexer.budget
+
+    def consume(self):
+        self.budget.step()
+        super().consume()
+
+
+class LimitedParser(stellaParser):
+    """Counts every node of the tree as it is built, and the depth of rules being parsed."""
+
+    def __init__(self, token_stream: LimitedTokenStream):
+        super().__init__(token_stream)
+        self.budget = token_stream.budget
+
+    def enterRule(self, localctx, state: int, ruleIndex: int):
+        self.budget.enter_node()
+        super().enterRule(localctx, state, ruleIndex)
+
+    def exitRule(self):
+        self.budget.exit_node()
+        super().exitRule()
+
+    def enterRecursionRule(self, localctx, state: int, ruleIndex: int, precedence: int):
+        self.budget.enter_node()
+        super().enterRecursionRule(localctx, state, ruleIndex, precedence)
+
+    def pushNewRecursionContext(self, localctx, state: int, ruleIndex: int):
+        # A new node around the left operand, at the same depth
+        self.budget.enter_node()
+        self.budget.exit_node()
+        super().pushNewRecursionContext(localctx, state, ruleIndex)
+
+    def unrollRecursionContexts(self, parentCtx):
+        self.budget.exit_node()
+        super().unrollRecursionContexts(parentCtx)
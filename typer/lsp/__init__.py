@@ -0,0 +1,2 @@
+from typer.lsp.document import Document
+from typer.lsp.server import LanguageServer, serve
@@ -0,0 +1,254 @@
+import re
+
+from bisect import bisect_right
+
+from antlr4 import InputStream, CommonTokenStream, ParserRuleContext, Token
+from antlr4.error.ErrorListener import ErrorListener
+
+from typer.grammar.stellaLexer import stellaLexer
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import CheckerState
+from typer.typecheck.infer_types import infer_declaration_types
+from typer.typecheck.type_error import StellaTypeError, Span
+from typer.typecheck.type_format import format_type
+
+# Top-level declarations are split at lines starting with a declaration keyword
+_DECLARATION_START = re.compile(r"^(?:inline|fn|generic|type|exception)\b", re.MULTILINE)
+
+# Node attributes whose value depends on declarations outside the node's own segment, such as type aliases
+_PROGRAM_DEPENDENT_CACHES = ("alias_expansion", "instantiations", "type_key", "unfolding", "compiled_decision_tree",
+                             "type_index")
+
+ERROR, WARNING = 1, 2
+
+
+class _SyntaxErrors(ErrorListener):
+    def __init__(self):
+        self.errors = []
+
+    def syntaxError(self, recognizer, offendingSymbol, line, column, msg, e):
+        self.errors.append((line, column, msg))
+
+
+class Segment:
+    """A top-level part of a document: the language header, or a declaration. Each segment is parsed on its own, so
+    its tree, its check results and the types recorded on its nodes survive edits elsewhere in the document.
+    Positions in the tree are relative to the segment's first line."""
+
+    def __init__(self, text: str, is_header: bool):
+        self.text = text
+        self.start_line = 0
+        self.extensions = []
+        self.decls = []
+        self.syntax_errors = []
+        # Warnings and error of checking the segment's functions, None until checked
+        self.warnings: list[StellaTypeError] | None = None
+        self.error: StellaTypeError | None = None
+        self.line_starts = None
+        self._parse(is_header)
+        self.interface = self._interface() if not self.syntax_errors else None
+
+    def _parse(self, is_header: bool):
+        lexer = stellaLexer(InputStream(self.text))
+        parser = Stella(CommonTokenStream(lexer))
+        listener = _SyntaxErrors()
+        for recognizer in (lexer, parser):
+            recognizer.removeErrorListeners()
+            recognizer.addErrorListener(listener)
+        self.parser = parser
+        if is_header:
+            program = parser.program()
+            self.extensions, self.decls = program.extensions, list(program.decls)
+        while not listener.errors and parser.getCurrentToken().type != Token.EOF:
+            self.decls.append(parser.decl())
+        self.syntax_errors = listener.errors
+
+    def _interface(self) -> tuple:
+        # What other declarations see of this segment: everything but function bodies
+        parts = [" ".join(name.text for extension in self.extensions for name in extension.extensionNames)]
+        for decl in self.decls:
+            if isinstance(decl, (Stella.DeclFunContext, Stella.DeclFunGenericContext)):
+                body = decl.localDecls[0] if decl.localDecls else decl.returnExpr
+                parts.append(self.text[decl.start.start:body.start.start] if body is not None else decl.getText())
+            else:
+                parts.append(decl.getText())
+        return tuple(parts)
+
+    def forget_check(self):
+        """Drops the check results and what nodes cached while resolving types through other declarations."""
+        self.warnings = self.error = None
+        pending = list(self.decls)
+        while pending:
+            node = pending.pop()
+            attributes = vars(node)
+            for cache in _PROGRAM_DEPENDENT_CACHES:
+                attributes.pop(cache, None)
+            if node.children:
+                pending.extend(child for child in node.children if isinstance(child, ParserRuleContext))
+
+    def offset(self, line: int, character: int) -> int:
+        return self._line_starts()[min(line, len(self._line_starts()) - 1)] + character
+
+    def position(self, offset: int) -> dict:
+        """Document position of an offset into the segment's text."""
+        line = bisect_right(self._line_starts(), offset) - 1
+        return {"line": self.start_line + line, "character": offset - self._line_starts()[line]}
+
+    def _line_starts(self) -> list[int]:
+        if self.line_starts is None:
+            self.line_starts = [0] + [match.end() for match in re.finditer("\n", self.text)]
+        return self.line_starts
+
+    def fun_decls(self) -> list:
+        return [decl for decl in self.decls if isinstance(decl, (Stella.DeclFunContext, Stella.DeclFunGenericContext))]
+
+
+class Document:
+    def __init__(self, uri: str, text: str):
+        self.uri = uri
+        self.text = text
+        self.segments: list[Segment] = []
+        self.program_error: StellaTypeError | None = None
+        self._interface = None
+
+    def apply_change(self, change: dict):
+        """Applies a content change of textDocument/didChange: a full text, or a range and its replacement."""
+        if "range" not in change:
+            self.text = change["text"]
+            return
+        start, end = self._offset(change["range"]["start"]), self._offset(change["range"]["end"])
+        self.text = self.text[:start] + change["text"] + self.text[end:]
+
+    def _offset(self, position: dict) -> int:
+        offset = 0
+        for _ in range(position["line"]):
+            newline = self.text.find("\n", offset)
+            if newline < 0:
+                return len(self.text)
+            offset = newline + 1
+        return min(offset + position["character"], len(self.text))
+
+    def update(self) -> list[dict]:
+        """Re-parses the declarations whose text changed and re-checks what they affect. Returns the diagnostics."""
+        self._resegment(whole=False)
+        header = self.segments[0]
+        extensions = {name.text for extension in header.extensions for name in extension.extensionNames}
+        if CheckerState(extensions).type_reconstruction and len(self.segments) > 1:
+            # Reconstruction solves the return types of every function together, so the program is one segment
+            self._resegment(whole=True)
+        if any(segment.syntax_errors for segment in self.segments):
+            return self._diagnostics()
+
+        # Signatures, aliases and extensions are shared by every body, so a change there re-checks everything
+        interface = tuple(segment.interface for segment in self.segments)
+        if interface != self._interface:
+            for segment in self.segments:
+                segment.forget_check()
+            self._interface = interface
+
+        program = Stella.ProgramContext(self.segments[0].parser)
+        program.extensions = self.segments[0].extensions
+        program.decls = [decl for segment in self.segments for decl in segment.decls]
+        self._check(program)
+        return self._diagnostics()
+
+    def _check(self, program: Stella.ProgramContext):
+        unchecked = [segment for segment in self.segments if segment.warnings is None]
+        try:
+            results = infer_declaration_types(program, [decl for segment in unchecked for decl in segment.fun_decls()],
+                                              record_types=True)
+            self.program_error = None
+        except StellaTypeError as e:
+            self.program_error = e
+            for segment in self.segments:
+                segment.warnings = segment.error = None
+            return
+        segment_of = {decl: segment for segment in unchecked for decl in segment.decls}
+        for segment in unchecked:
+            segment.warnings, segment.error = [], None
+        for decl, warnings, error in results:
+            segment = segment_of[decl]
+            segment.warnings.extend(warnings)
+            segment.error = segment.error or error
+
+    def _resegment(self, whole: bool):
+        starts = [0]
+        if not whole:
+            starts += [match.start() for match in _DECLARATION_START.finditer(self.text) if match.start() > 0]
+        texts = [self.text[start:end] for start, end in zip(starts, starts[1:] + [len(self.text)])]
+        previous = {}
+        for i, segment in enumerate(self.segments):
+            previous.setdefault((segment.text, i == 0), []).append(segment)
+
+        def parsed(text: str, is_header: bool) -> Segment:
+            reused = previous.get((text, is_header))
+            return reused.pop() if reused else Segment(text, is_header)
+
+        # A keyword at the start of a line inside a declaration splits it in two halves that do not parse on their own
+        merged = []
+        for i, text in enumerate(texts):
+            segment = parsed(text, i == 0)
+            if merged and merged[-1].syntax_errors and segment.syntax_errors:
+                joined = parsed(merged[-1].text + text, len(merged) == 1)
+                if not joined.syntax_errors:
+                    merged[-1] = joined
+                    continue
+            merged.append(segment)
+        self.segments = merged
+        self._place_segments()
+
+    def _place_segments(self):
+        line = 0
+        for segment in self.segments:
+            segment.start_line = line
+            line += segment.text.count("\n")
+
+    def _segment_at(self, line: int) -> Segment:
+        for segment in reversed(self.segments):
+            if segment.start_line <= line:
+                return segment
+        return self.segments[0]
+
+    def _diagnostics(self) -> list[dict]:
+        diagnostics = []
+        for segment in self.segments:
+            for line, column, message in segment.syntax_errors:
+                position = {"line": segment.start_line + line - 1, "character": column}
+                diagnostics.append({"range": {"start": position, "end": position}, "severity": ERROR,
+                                    "source": "typer", "code": "ERROR_PARSE", "message": message})
+            if segment.syntax_errors:
+                continue
+            for warning in segment.warnings or ():
+                diagnostics.append(self._diagnostic(segment, warning, WARNING))
+            if segment.error is not None:
+                diagnostics.append(self._diagnostic(segment, segment.error, ERROR))
+        if self.program_error is not None:
+            diagnostics.append(self._diagnostic(self.segments[0], self.program_error, ERROR))
+        return diagnostics
+
+    def _diagnostic(self, segment: Segment, error: StellaTypeError, severity: int) -> dict:
+        span = error.span or Span(1, 0, 1, 0)
+        return {
+            "range": {"start": {"line": segment.start_line + span.start_line - 1, "character": span.start_column},
+                      "end": {"line": segment.start_line + span.end_line - 1, "character": span.end_column}},
+            "severity": severity,
+            "source": "typer",
+            "code": error.code,
+            "message": error.message,
+        }
+
+    def hover(self, line: int, character: int) -> dict | None:
+        """The type inferred by the last check for the innermost expression at the position."""
+        if not self.segments:
+            return None
+        segment = self._segment_at(line)
+        offset = segment.offset(line - segment.start_line, character)
+        for decl in segment.fun_decls():
+            interval = decl.type_index.at(offset) if hasattr(decl, "type_index") else None
+            if interval is not None:
+                return {
+                    "contents": {"kind": "plaintext", "value": format_type(interval.type)},
+                    "range": {"start": segment.position(interval.start), "end": segment.position(interval.stop + 1)},
+                }
+        return None
+
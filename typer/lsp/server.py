@@ -0,0 +1,135 @@
+import json
+import sys
+
+from typing import BinaryIO
+
+from typer.lsp.document import Document, ERROR
+
+# JSON-RPC error codes
+METHOD_NOT_FOUND = -32601
+INTERNAL_ERROR = -32603
+
+INCREMENTAL_SYNC = 2
+
+
+def read_message(stream: BinaryIO) -> dict | None:
+    """Reads one message framed by a Content-Length header; None at the end of the stream."""
+    content_length = None
+    while True:
+        line = stream.readline()
+        if not line:
+            return None
+        line = line.strip()
+        if not line:
+            break
+        name, _, value = line.decode("ascii").partition(":")
+        if name.lower() == "content-length":
+            content_length = int(value)
+    if content_length is None:
+        return None
+    return json.loads(stream.read(content_length))
+
+
+def write_message(stream: BinaryIO, message: dict):
+    body = json.dumps(message).encode("utf-8")
+    stream.write(f"Content-Length: {len(body)}\r\n\r\n".encode("ascii") + body)
+    stream.flush()
+
+
+class LanguageServer:
+    def __init__(self, output: BinaryIO):
+        self.output = output
+        self.documents: dict[str, Document] = {}
+        self.shutdown_requested = False
+
+    def handle(self, message: dict):
+        method = message.get("method")
+        handler = getattr(self, "_" + method.replace("/", "_").replace("$", "dollar"), None) if method else None
+        if "id" not in message:
+            if handler is not None:
+                try:
+                    handler(message.get("params") or {})
+                except Exception as e:
+                    # No response to carry the failure, and the session must outlive it
+                    self._report_failure(method, message.get("params") or {}, e)
+            return
+        if handler is None:
+            self._respond(message["id"], error={"code": METHOD_NOT_FOUND, "message": f"Unknown method {method}"})
+            return
+        try:
+            result = handler(message.get("params") or {})
+        except Exception as e:
+            self._respond(message["id"], error={"code": INTERNAL_ERROR, "message": str(e)})
+            return
+        self._respond(message["id"], result=result)
+
+    def _respond(self, request_id, result=None, error=None):
+        response = {"jsonrpc": "2.0", "id": request_id}
+        if error is not None:
+            response["error"] = error
+        else:
+            response["result"] = result
+        write_message(self.output, response)
+
+    def _publish(self, document: Document, diagnostics: list[dict]):
+        write_message(self.output, {"jsonrpc": "2.0", "method": "textDocument/publishDiagnostics",
+                                    "params": {"uri": document.uri, "diagnostics": diagnostics}})
+
+    def _report_failure(self, method: str, params: dict, error: Exception):
+        print(f"typer lsp: {method} failed: {type(error).__name__}: {error}", file=sys.stderr, flush=True)
+        document = self.documents.get(params.get("textDocument", {}).get("uri"))
+        if document is not None:
+            start = {"line": 0, "character": 0}
+            self._publish(document, [{"range": {"start": start, "end": start}, "severity": ERROR, "source": "typer",
+                                      "code": type(error).__name__,
+                                      "message": f"The document could not be checked: {type(error).__name__}: {error}"}])
+
+    def _initialize(self, params: dict) -> dict:
+        return {
+            "capabilities": {
+                "textDocumentSync": {"openClose": True, "change": INCREMENTAL_SYNC},
+                "hoverProvider": True,
+            },
+            "serverInfo": {"name": "typer"},
+        }
+
+    def _initialized(self, params: dict):
+        pass
+
+    def _shutdown(self, params: dict):
+        self.shutdown_requested = True
+
+    def _textDocument_didOpen(self, params: dict):
+        text_document = params["textDocument"]
+        document = self.documents[text_document["uri"]] = Document(text_document["uri"], text_document["text"])
+        self._publish(document, document.update())
+
+    def _textDocument_didChange(self, params: dict):
+        document = self.documents[params["textDocument"]["uri"]]
+        for change in params["contentChanges"]:
+            document.apply_change(change)
+        self._publish(document, document.update())
+
+    def _textDocument_didClose(self, params: dict):
+        document = self.documents.pop(params["textDocument"]["uri"], None)
+        if document is not None:
+            self._publish(document, [])
+
+    def _textDocument_hover(self, params: dict) -> dict | None:
+        document = self.documents.get(params["textDocument"]["uri"])
+        if document is None:
+            return None
+        return document.hover(params["position"]["line"], params["position"]["character"])
+
+
+def serve(input_stream: BinaryIO = None, output_stream: BinaryIO = None) -> int:
+    """Serves the Language Server Protocol over stdio until the client sends exit."""
+    input_stream = input_stream or sys.stdin.buffer
+    server = LanguageServer(output_stream or sys.stdout.buffer)
+    while True:
+        message = read_message(input_stream)
+        if message is None:
+            return 1
+        if message.get("method") == "exit":
+            return 0 if server.shutdown_requested else 1
+        server.handle(message)
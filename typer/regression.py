@@ -0,0 +1,94 @@
+import os
+import sys
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import TextIO
+
+from typer.report import check_file
+
+WELL_TYPED = "well-typed"
+ILL_TYPED = "ill-typed"
+# Outcome of a well-typed program in the matrix
+OK = "ok"
+
+
+def expected_outcome(path: str) -> str | None:
+    """The outcome a test file's path encodes: OK under well-typed/, the error code of the directory under
+    ill-typed/ (ill-typed/ERROR_XXX/...), or ILL_TYPED for any error when no code is given. None when the path
+    encodes no outcome."""
+    parts = os.path.normpath(path).split(os.sep)
+    for i, part in enumerate(parts[:-1]):
+        if part == WELL_TYPED:
+            return OK
+        if part == ILL_TYPED:
+            following = parts[i + 1] if i + 2 < len(parts) else ""
+            return following if following.startswith("ERROR_") else ILL_TYPED
+    return None
+
+
+def find_tests(directory: str) -> list[str]:
+    paths = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        paths.extend(os.path.join(root, file) for file in sorted(files) if file.endswith(".st"))
+    return paths
+
+
+def outcome(record: dict) -> str:
+    return OK if record["verdict"] == "ok" else record["error_code"]
+
+
+def passes(expected: str, actual: str) -> bool:
+    # A file that could not be read or checked (internal_error, limit_exceeded) has not been shown to be ill-typed
+    return actual == expected or (expected == ILL_TYPED and actual.startswith("ERROR_"))
+
+
+def run_tests(directory: str, jobs: int | None = None, stream: TextIO = sys.stdout, failures_only: bool = False) \
+        -> bool:
+    """Checks every .st file under the directory whose path encodes an expected outcome and prints one line per file
+    as results come in, then the matrix of expected against actual outcomes. Returns whether every file passed."""
+    started = time.perf_counter()
+    tests = [(path, expected_outcome(path)) for path in find_tests(directory)]
+    skipped = sum(1 for _, expected in tests if expected is None)
+    tests = [(path, expected) for path, expected in tests if expected is not None]
+
+    matrix: dict[str, dict[str, int]] = {}
+    times: dict[str, float] = {}
+    failed = 0
+    with ProcessPoolExecutor(jobs) as executor:
+        records = executor.map(check_file, [path for path, _ in tests], chunksize=8)
+        for (path, expected), record in zip(tests, records):
+            actual = outcome(record)
+            matrix.setdefault(expected, {}).setdefault(actual, 0)
+            matrix[expected][actual] += 1
+            total_ms = record["timings"]["total_ms"]
+            times[expected] = times.get(expected, 0.0) + total_ms
+            if passes(expected, actual):
+                if not failures_only:
+                    print(f"PASS {total_ms:9.1f} ms  {path}", file=stream)
+            else:
+                failed += 1
+                print(f"FAIL {total_ms:9.1f} ms  {path}: expected {expected}, got {actual}", file=stream)
+
+    _print_matrix(matrix, times, stream)
+    print(f"{len(tests) - failed} passed, {failed} failed, {skipped} skipped in "
+          f"{time.perf_counter() - started:.2f} s ({sum(times.values()) / 1000:.2f} s checking)", file=stream)
+    return failed == 0
+
+
+def _print_matrix(matrix: dict[str, dict[str, int]], times: dict[str, float], stream: TextIO):
+    # One row per expected outcome; failing files are broken down by the outcome they had instead
+    rows = sorted(matrix, key=lambda o: (o != OK, o))
+    width = max([len("expected"), *(len(row) for row in rows), *(len(actual) + 4 for row in rows
+                                                                    for actual in matrix[row])])
+    print(file=stream)
+    print(f"{'expected':<{width}}  {'pass':>6}  {'fail':>6}  {'time ms':>10}", file=stream)
+    for expected in rows:
+        passed = sum(count for actual, count in matrix[expected].items() if passes(expected, actual))
+        failed = sum(matrix[expected].values()) - passed
+        print(f"{expected:<{width}}  {passed:>6}  {failed:>6}  {times[expected]:>10.1f}", file=stream)
+        for actual, count in sorted(matrix[expected].items()):
+            if not passes(expected, actual):
+                print(f"{'  as ' + actual:<{width}}  {'':>6}  {count:>6}", file=stream)
+    print(file=stream)
@@ -0,0 +1,131 @@
+import json
+import sys
+import time
+
+from typing import TextIO
+
+from typer.api import check
+from typer.limits import CheckLimits
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+
+
+def check_file(path: str, limits: CheckLimits | None = None) -> dict:
+    started = time.perf_counter()
+    try:
+        with open(path, "r") as f:
+            source = f.read()
+    except (OSError, UnicodeDecodeError) as e:
+        # Reported like any other file, so the files after it are still checked and the output stays whole
+        return {"path": path, "verdict": "internal_error", "error_code": type(e).__name__, "message": str(e),
+                "span": None, "warnings": [], "timings": {"total_ms": _ms(time.perf_counter() - started)}}
+    return check_source(source, path, started, limits)
+
+
+def check_source(source: str, path: str | None = None, started: float | None = None,
+                 limits: CheckLimits | None = None) -> dict:
+    """The record of checking a program: its verdict, error, warnings and timings."""
+    record = {"path": path, "verdict": "ok", "error_code": None, "message": None, "span": None, "warnings": []}
+    started = time.perf_counter() if started is None else started
+    read_ms = _ms(time.perf_counter() - started)
+    try:
+        result = check(source, limits=limits)
+        record.update(verdict=result.verdict, error_code=result.error_code, message=result.message,
+                      span=result.span._asdict() if result.span else None,
+                      warnings=[{"code": warning.code, "message": warning.message,
+                                 "span": warning.span._asdict() if warning.span else None}
+                                for warning in result.warnings])
+        timings = result.timings
+    except Exception as e:
+        record.update(verdict="internal_error", error_code=type(e).__name__, message=str(e))
+        timings = {}
+
+    record["timings"] = {"read_ms": read_ms, **timings, "total_ms": _ms(time.perf_counter() - started)}
+    return record
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+class TextReporter:
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+
+    def report(self, record: dict):
+        for warning in record["warnings"]:
+            span = warning["span"]
+            position = f":{span['start_line']}:{span['start_column'] + 1}" if span else ""
+            print(f"{record['path']}{position}: warning: {warning['message']}", file=sys.stderr)
+        if record["verdict"] != "ok":
+            print(record["message"], file=self.stream)
+
+    def finish(self):
+        pass
+
+
+class JsonLinesReporter:
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+
+    def report(self, record: dict):
+        self.stream.write(json.dumps(record) + "\n")
+        self.stream.flush()
+
+    def finish(self):
+        pass
+
+
+class SarifReporter:
+    # A SARIF log is a single JSON document, so results are collected and written on finish
+    def __init__(self, stream: TextIO = sys.stdout):
+        self.stream = stream
+        self.results = []
+        self.rules = {}
+        self.timings = {}
+
+    def report(self, record: dict):
+        self.timings[record["path"]] = record["timings"]
+        for warning in record["warnings"]:
+            self._add_result(record, "warning", warning["code"], warning["message"], warning["span"])
+        if record["verdict"] != "ok":
+            self._add_result(record, "error", record["error_code"], record["message"], record["span"])
+
+    def _add_result(self, record: dict, level: str, code: str, message: str, span: dict | None):
+        self.rules.setdefault(code, {"id": code})
+        location = {"artifactLocation": {"uri": record["path"]}}
+        if span:
+            location["region"] = {
+                "startLine": span["start_line"],
+                "startColumn": span["start_column"] + 1,
+                "endLine": span["end_line"],
+                "endColumn": span["end_column"] + 1,
+            }
+        self.results.append({
+            "ruleId": code,
+            "level": level,
+            "message": {"text": message},
+            "locations": [{"physicalLocation": location}],
+            "properties": {"verdict": record["verdict"], "timings": record["timings"]},
+        })
+
+    def finish(self):
+        log = {
+            "$schema": SARIF_SCHEMA,
+            "version": "2.1.0",
+            "runs": [{
+                "tool": {"driver": {"name": "typer", "rules": list(self.rules.values())}},
+                "results": self.results,
+                "properties": {"timings": self.timings},
+            }],
+        }
+        json.dump(log, self.stream, indent=2)
+        self.stream.write("\n")
+        self.stream.flush()
+
+
+REPORTERS = {
+    "text": TextReporter,
+    "jsonl": JsonLinesReporter,
+    "sarif": SarifReporter,
+}
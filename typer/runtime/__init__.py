@@ -0,0 +1,26 @@
+from typer.api import parse_expression
+from typer.typecheck.checker_state import activate_checker_state
+from typer.typecheck.infer_types import infer_expression_type
+from typer.typecheck.type_map import TypeMap
+from typer.runtime.bytecode import CompiledProgram
+from typer.runtime.compiler import compile_program, compile_expression
+from typer.runtime.values import Closure, format_value
+from typer.runtime.vm import VirtualMachine, StellaRuntimeError, PanicError, UncaughtExceptionError
+
+
+def parse_input(program: CompiledProgram, source: str):
+    """Evaluates a closed Stella expression given as an argument of main, checked against main's parameter type."""
+    expression = parse_expression(source)
+    param_types, _ = program.main_type
+    with activate_checker_state(program.checker_state):
+        infer_expression_type(expression, TypeMap(), param_types[0])
+    return VirtualMachine(program.functions).call(Closure(compile_expression(expression, program.checker_state), ()),
+                                                  [])
+
+
+def run_main(program: CompiledProgram, argument) -> str:
+    """Calls main with an evaluated argument and formats its result as Stella syntax."""
+    vm = VirtualMachine(program.functions)
+    result = vm.call(vm.globals[program.main_index], [argument])
+    with activate_checker_state(program.checker_state):
+        return format_value(result, program.main_type[1])
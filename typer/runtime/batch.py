@@ -0,0 +1,60 @@
+import json
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from typer.api import check
+from typer.runtime import CompiledProgram, StellaRuntimeError, compile_program, parse_input, run_main
+from typer.typecheck.type_error import StellaTypeError
+
+# Inputs per task sent to a worker process
+CHUNK_SIZE = 64
+
+
+def read_inputs(path: str) -> Iterator[str]:
+    """Inputs of a JSON Lines file: each line is a Stella expression as a JSON string, or an object with an "input"
+    field. Blank lines are skipped."""
+    with open(path) as inputs_file:
+        for line in inputs_file:
+            if not line.strip():
+                continue
+            value = json.loads(line)
+            yield value["input"] if isinstance(value, dict) else value
+
+
+def evaluate(program: CompiledProgram, program_input: str) -> dict:
+    record = {"input": program_input, "verdict": "ok", "output": None, "message": None}
+    try:
+        record["output"] = run_main(program, parse_input(program, program_input))
+    except StellaTypeError as e:
+        record.update(verdict="error", message=e.message)
+    except StellaRuntimeError as e:
+        record.update(verdict="runtime_error", message=str(e))
+    except Exception as e:
+        # A failure of the checker or evaluator on this input must not take the other inputs down with it
+        record.update(verdict="internal_error", message=f"{type(e).__name__}: {e}")
+    return record
+
+
+def run_inputs(program: CompiledProgram, source: str, inputs: Iterable[str], jobs: int = 1) -> Iterator[dict]:
+    """Evaluates main on every input, yielding one record per input in input order as soon as it is known. With
+    several jobs the inputs are spread over worker processes; parse trees do not cross process boundaries, so each
+    worker checks and compiles the source once when it starts."""
+    if jobs <= 1:
+        for program_input in inputs:
+            yield evaluate(program, program_input)
+        return
+    with ProcessPoolExecutor(jobs, initializer=_start_worker, initargs=(source,)) as executor:
+        yield from executor.map(_evaluate_in_worker, inputs, chunksize=CHUNK_SIZE)
+
+
+_worker_program: CompiledProgram | None = None
+
+
+def _start_worker(source: str):
+    global _worker_program
+    _worker_program = compile_program(check(source).program)
+
+
+def _evaluate_in_worker(program_input: str) -> dict:
+    return evaluate(_worker_program, program_input)
@@ -0,0 +1,61 @@
+from typing import NamedTuple
+
+# Every instruction is an (opcode, argument) pair; instructions that take no argument carry None.
+(
+    CONST,          # push the constant
+    LOAD_LOCAL,     # push local slot
+    LOAD_FREE,      # push a value captured by the current closure
+    LOAD_GLOBAL,    # push top-level function
+    STORE_LOCAL,    # pop into local slot
+    POP,
+    JUMP,
+    JUMP_IF_FALSE,  # pop a Bool, jump when it is false
+    SUCC,
+    PRED,
+    IS_ZERO,
+    BINARY,         # pop two operands, push argument(left, right)
+    NOT,
+    MAKE_CLOSURE,   # push a closure of the code object, capturing the values its captures name
+    RECAPTURE,      # recapture the free variables of the closures in the argument's slots
+    CALL,           # pop argument count arguments and a function, call it
+    TAIL_CALL,      # like CALL, replacing the current frame instead of returning to it
+    APPLY_UNROLLED, # pop the unrolling of the fixed point in slot 0, tail call it with the arguments in slot 1
+    RETURN,
+    FIX,            # replace a function by its fixed point; the argument tells whether its unrolling may be cached
+    FOR_RANGE,      # loop head: jump to the argument's exit unless its counter slot is below its limit slot
+    INCREMENT,      # increment the Nat in the local slot
+    MAKE_TUPLE,     # pop argument count values into a tuple
+    MAKE_RECORD,    # pop one value per label of the argument into a record
+    GET,            # replace the top of the stack by its element at the argument (tuple index or record label)
+    MAKE_TAGGED,    # pop a payload (or None for nullary variants) and tag it with the argument
+    MAKE_LIST,      # pop argument count values into a list
+    CONS,
+    HEAD,
+    TAIL,
+    IS_EMPTY,
+    MATCH,          # pop the scrutinee, bind the slots of the case its decision tree selects and jump to the case
+    MATCH_PATTERN,  # pop a value and bind it with a pattern plan, jumping to the argument's target on failure
+    NEW_REF,
+    DEREF,
+    ASSIGN,
+    THROW,
+    PANIC,
+    TRY,            # install an exception handler at the argument
+    END_TRY,
+) = range(40)
+
+
+class Code(NamedTuple):
+    name: str
+    param_count: int
+    local_count: int
+    instructions: list[tuple[int, object]]
+    # Per captured value: whether it is a local slot (or else a captured value) of the creating function, and its index
+    captures: tuple[tuple[bool, int], ...]
+
+
+class CompiledProgram(NamedTuple):
+    functions: list[Code]
+    main_index: int
+    main_type: object
+    checker_state: object
@@ -0,0 +1,417 @@
+import operator
+
+from antlr4.Token import Token
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import activate_checker_state
+from typer.typecheck.decision_tree import decision_tree
+from typer.typecheck.exhaustive_check import INL, INR
+from typer.typecheck.recursive_types import head_type
+from typer.typecheck.spine import left_spine
+from typer.runtime.bytecode import *
+from typer.runtime.patterns import MatchPlan, match_tree, pattern_plan
+
+
+def _monus(left: int, right: int) -> int:
+    return left - right if left > right else 0
+
+
+def _divide(left: int, right: int) -> int:
+    # Nat division by zero yields zero rather than failing
+    return left // right if right else 0
+
+
+_BINARY_OPERATORS = {
+    Stella.AddContext: operator.add,
+    Stella.SubtractContext: _monus,
+    Stella.MultiplyContext: operator.mul,
+    Stella.DivideContext: _divide,
+    Stella.LessThanContext: operator.lt,
+    Stella.LessThanOrEqualContext: operator.le,
+    Stella.GreaterThanContext: operator.gt,
+    Stella.GreaterThanOrEqualContext: operator.ge,
+    Stella.EqualContext: operator.eq,
+    Stella.NotEqualContext: operator.ne,
+}
+_ARITHMETIC_OPERATORS = tuple(_BINARY_OPERATORS)[:4]
+
+
+def compile_program(program_context: Stella.ProgramContext) -> CompiledProgram:
+    """Compiles a type checked program. Top-level functions become globals; every variable reference is resolved,
+    through the binding the checker recorded for it, to a global, a slot of the current frame or a captured value of
+    the current closure. Closures capture only the variables they use."""
+    try:
+        state = program_context.checker_state
+    except AttributeError:
+        raise ValueError("Program has not been type checked") from None
+
+    fun_declarations = [decl for decl in program_context.decls
+                        if isinstance(decl, (Stella.DeclFunContext, Stella.DeclFunGenericContext))]
+    global_slots = {decl.name: i for i, decl in enumerate(fun_declarations)}
+    with activate_checker_state(state):
+        functions = [_compile_function(decl, decl.name.text, decl.paramDecls, None, global_slots)
+                     for decl in fun_declarations]
+    main_index = next(i for i, decl in enumerate(fun_declarations) if decl.name.text == "main")
+    main_decl = fun_declarations[main_index]
+    main_type = ([param.paramType for param in main_decl.paramDecls], main_decl.returnType)
+    return CompiledProgram(functions, main_index, main_type, state)
+
+
+def compile_expression(expression: Stella.ExprContext, checker_state) -> Code:
+    """Compiles a closed expression, such as a program input, into a function of no parameters."""
+    with activate_checker_state(checker_state):
+        function = _FunctionCompiler("<input>", None, {})
+        function.expression(expression)
+        function.emit(RETURN)
+        return function.code(0)
+
+
+def _compile_function(decl, name: str, param_decls, parent: '_FunctionCompiler | None', global_slots: dict) -> Code:
+    function = _FunctionCompiler(name, parent, global_slots)
+    for param_decl in param_decls:
+        function.declare(param_decl.name)
+    local_decls = [local for local in getattr(decl, "localDecls", ())
+                   if isinstance(local, (Stella.DeclFunContext, Stella.DeclFunGenericContext))]
+    # Local functions may refer to each other, so their closures capture the sibling slots once all of them exist
+    local_slots = tuple(function.declare(local.name) for local in local_decls)
+    for local, slot in zip(local_decls, local_slots):
+        function.emit(MAKE_CLOSURE, _compile_function(local, local.name.text, local.paramDecls, function, global_slots))
+        function.emit(STORE_LOCAL, slot)
+    if local_slots:
+        function.emit(RECAPTURE, local_slots)
+    function.expression(decl.returnExpr, tail=True)
+    function.emit(RETURN)
+    return function.code(len(param_decls))
+
+
+def _is_function_type(stella_type: Stella.StellatypeContext) -> bool:
+    stella_type = head_type(stella_type)
+    while isinstance(stella_type, Stella.TypeForAllContext):
+        # Types are erased, so a generic function is a function
+        stella_type = head_type(stella_type.type_)
+    return isinstance(stella_type, Stella.TypeFunContext)
+
+
+def _curried_abstraction(expression: Stella.ExprContext) \
+        -> tuple[Stella.AbstractionContext, Stella.AbstractionContext] | None:
+    """The two functions of an expression of the form fn(...) { return fn(...) {...} }, if it has that form."""
+    abstractions = []
+    for _ in range(2):
+        while isinstance(expression, Stella.ParenthesisedExprContext):
+            expression = expression.expr_
+        if not isinstance(expression, Stella.AbstractionContext):
+            return None
+        abstractions.append(expression)
+        expression = expression.returnExpr
+    return abstractions[0], abstractions[1]
+
+
+class _FunctionCompiler:
+    def __init__(self, name: str, parent: '_FunctionCompiler | None', global_slots: dict):
+        self.name = name
+        self.parent = parent
+        self.global_slots = global_slots
+        self.instructions = []
+        self.local_count = 0
+        self.local_slots = {}
+        self.free_slots = {}
+        # For each captured value, where the function creating the closure finds it
+        self.captures = []
+
+    def code(self, param_count: int) -> Code:
+        return Code(self.name, param_count, self.local_count, self.instructions, tuple(self.captures))
+
+    def declare(self, binder: Token) -> int:
+        self.local_slots[binder] = self.new_slot()
+        return self.local_slots[binder]
+
+    def new_slot(self) -> int:
+        self.local_count += 1
+        return self.local_count - 1
+
+    def emit(self, op: int, arg=None) -> int:
+        self.instructions.append((op, arg))
+        return len(self.instructions) - 1
+
+    def patch(self, index: int, arg):
+        self.instructions[index] = (self.instructions[index][0], arg)
+
+    def here(self) -> int:
+        return len(self.instructions)
+
+    def access(self, binder: Token) -> tuple[int, int]:
+        """Load instruction and index for a variable, registering it as a captured variable of this function and
+        of every function between this one and the binder's."""
+        if binder in self.local_slots:
+            return LOAD_LOCAL, self.local_slots[binder]
+        if binder in self.free_slots:
+            return LOAD_FREE, self.free_slots[binder]
+        if self.parent is None:
+            return LOAD_GLOBAL, self.global_slots[binder]
+        outer_op, outer_index = self.parent.access(binder)
+        if outer_op == LOAD_GLOBAL:
+            return outer_op, outer_index
+        self.free_slots[binder] = len(self.captures)
+        self.captures.append((outer_op == LOAD_LOCAL, outer_index))
+        return LOAD_FREE, self.free_slots[binder]
+
+    def expression(self, expression: Stella.ExprContext, tail: bool = False):
+        """Emits code pushing the value of the expression. In tail position the value is returned by the enclosing
+        function as it is, so a call there replaces the caller's frame."""
+        match expression:
+            case Stella.ConstTrueContext() | Stella.ConstFalseContext():
+                self.emit(CONST, isinstance(expression, Stella.ConstTrueContext))
+            case Stella.ConstIntContext():
+                self.emit(CONST, int(expression.n.text))
+            case Stella.ConstUnitContext():
+                self.emit(CONST, None)
+            case Stella.VarContext():
+                self.emit(*self.access(expression.binder))
+            case Stella.SuccContext() | Stella.PredContext() | Stella.IsZeroContext():
+                self.expression(expression.n)
+                self.emit({Stella.SuccContext: SUCC, Stella.PredContext: PRED, Stella.IsZeroContext: IS_ZERO}[
+                    type(expression)])
+            case Stella.NatRecContext():
+                self._nat_rec(expression)
+            case Stella.IfContext():
+                self.expression(expression.condition)
+                to_else = self.emit(JUMP_IF_FALSE)
+                self.expression(expression.thenExpr, tail)
+                to_end = self.emit(JUMP)
+                self.patch(to_else, self.here())
+                self.expression(expression.elseExpr, tail)
+                self.patch(to_end, self.here())
+            case Stella.AbstractionContext():
+                self.emit(MAKE_CLOSURE, _compile_function(expression, "<lambda>", expression.paramDecls, self,
+                                                                self.global_slots))
+            case Stella.ApplicationContext():
+                self.expression(expression.fun)
+                for argument in expression.args:
+                    self.expression(argument)
+                self.emit(TAIL_CALL if tail else CALL, len(expression.args))
+            case Stella.FixContext():
+                self._fix(expression, tail)
+            case Stella.LetContext():
+                self._let(expression, tail)
+            case Stella.LetRecContext():
+                self._letrec(expression, tail)
+            case Stella.MatchContext():
+                self._match(expression, tail)
+            case Stella.SequenceContext():
+                first, sequences = left_spine(expression, Stella.SequenceContext, lambda e: e.expr1)
+                self.expression(first)
+                for i, sequence in enumerate(sequences):
+                    self.emit(POP)
+                    self.expression(sequence.expr2, tail and i == len(sequences) - 1)
+            case Stella.AddContext() | Stella.SubtractContext() | Stella.MultiplyContext() | Stella.DivideContext():
+                leftmost, operators = left_spine(expression, _ARITHMETIC_OPERATORS)
+                self.expression(leftmost)
+                for operator_ctx in operators:
+                    self.expression(operator_ctx.right)
+                    self.emit(BINARY, _BINARY_OPERATORS[type(operator_ctx)])
+            case Stella.LogicAndContext() | Stella.LogicOrContext():
+                self._logic_chain(expression)
+            case Stella.LogicNotContext():
+                self.expression(expression.expr_)
+                self.emit(NOT)
+            case Stella.LessThanContext() | Stella.LessThanOrEqualContext() | Stella.GreaterThanContext() \
+                    | Stella.GreaterThanOrEqualContext() | Stella.EqualContext() | Stella.NotEqualContext():
+                self.expression(expression.left)
+                self.expression(expression.right)
+                self.emit(BINARY, _BINARY_OPERATORS[type(expression)])
+            case Stella.TupleContext():
+                for element in expression.exprs:
+                    self.expression(element)
+                self.emit(MAKE_TUPLE, len(expression.exprs))
+            case Stella.DotTupleContext():
+                self.expression(expression.expr_)
+                self.emit(GET, int(expression.index.text) - 1)
+            case Stella.RecordContext():
+                for binding in expression.bindings:
+                    self.expression(binding.rhs)
+                self.emit(MAKE_RECORD, tuple(binding.name.text for binding in expression.bindings))
+            case Stella.DotRecordContext():
+                self.expression(expression.expr_)
+                self.emit(GET, expression.label.text)
+            case Stella.InlContext() | Stella.InrContext():
+                self.expression(expression.expr_)
+                self.emit(MAKE_TAGGED, INL if isinstance(expression, Stella.InlContext) else INR)
+            case Stella.VariantContext():
+                if expression.rhs is not None:
+                    self.expression(expression.rhs)
+                else:
+                    self.emit(CONST, None)
+                self.emit(MAKE_TAGGED, expression.label.text)
+            case Stella.ListContext():
+                for element in expression.exprs:
+                    self.expression(element)
+                self.emit(MAKE_LIST, len(expression.exprs))
+            case Stella.ConsListContext():
+                self.expression(expression.head)
+                self.expression(expression.tail)
+                self.emit(CONS)
+            case Stella.HeadContext() | Stella.TailContext() | Stella.IsEmptyContext():
+                self.expression(expression.list_)
+                self.emit({Stella.HeadContext: HEAD, Stella.TailContext: TAIL, Stella.IsEmptyContext: IS_EMPTY}[
+                    type(expression)])
+            case Stella.RefContext():
+                self.expression(expression.expr_)
+                self.emit(NEW_REF)
+            case Stella.DerefContext():
+                self.expression(expression.expr_)
+                self.emit(DEREF)
+            case Stella.AssignContext():
+                self.expression(expression.lhs)
+                self.expression(expression.rhs)
+                self.emit(ASSIGN)
+            case Stella.ConstMemoryContext():
+                self.emit(PANIC, f"memory address {expression.mem.text} cannot be dereferenced")
+            case Stella.PanicContext():
+                self.emit(PANIC)
+            case Stella.ThrowContext():
+                self.expression(expression.expr_)
+                self.emit(THROW)
+            case Stella.TryWithContext() | Stella.TryCatchContext():
+                self._try(expression)
+            case Stella.TypeApplicationContext():
+                # Types are erased: a type application is the generic value itself
+                self.expression(expression.fun, tail)
+            case Stella.ParenthesisedExprContext() | Stella.TerminatingSemicolonContext() \
+                    | Stella.TypeAbstractionContext() | Stella.TypeAscContext() | Stella.TypeCastContext() \
+                    | Stella.FoldContext() | Stella.UnfoldContext():
+                self.expression(expression.expr_, tail)
+            case _:
+                raise NotImplementedError(type(expression).__name__)
+
+    def _fix(self, expression: Stella.FixContext, tail: bool):
+        if _is_function_type(expression.fixed_point_type):
+            self.expression(expression.expr_)
+            # Unrolling fix (fn(self) { return fn(...) {...} }) only creates a closure, so it can be done once
+            self.emit(FIX, _curried_abstraction(expression.expr_) is not None)
+            return
+        # Any other fixed point is a value, so fix f is f (fix f) right away
+        function = self.new_slot()
+        self.expression(expression.expr_)
+        self.emit(STORE_LOCAL, function)
+        self.emit(LOAD_LOCAL, function)
+        self.emit(LOAD_LOCAL, function)
+        self.emit(FIX, False)
+        self.emit(TAIL_CALL if tail else CALL, 1)
+
+    def _nat_rec(self, expression: Stella.NatRecContext):
+        # Nat::rec(n, z, s) is s(n - 1)(... s(0)(z)): a loop counting from 0 to n. A step written as
+        # fn(i) { return fn(acc) {...} } is inlined, its parameters becoming the counter and result slots.
+        limit, result, counter = self.new_slot(), self.new_slot(), self.new_slot()
+        self.expression(expression.n)
+        self.emit(STORE_LOCAL, limit)
+        self.expression(expression.initial)
+        self.emit(STORE_LOCAL, result)
+        step = _curried_abstraction(expression.step)
+        if step is None:
+            step_slot = self.new_slot()
+            self.expression(expression.step)
+            self.emit(STORE_LOCAL, step_slot)
+        self.emit(CONST, 0)
+        self.emit(STORE_LOCAL, counter)
+        loop = self.emit(FOR_RANGE)
+        if step is not None:
+            outer, inner = step
+            self.local_slots[outer.paramDecls[0].name] = counter
+            self.local_slots[inner.paramDecls[0].name] = result
+            self.expression(inner.returnExpr)
+        else:
+            self.emit(LOAD_LOCAL, step_slot)
+            self.emit(LOAD_LOCAL, counter)
+            self.emit(CALL, 1)
+            self.emit(LOAD_LOCAL, result)
+            self.emit(CALL, 1)
+        self.emit(STORE_LOCAL, result)
+        self.emit(INCREMENT, counter)
+        self.emit(JUMP, loop)
+        self.patch(loop, (counter, limit, self.here()))
+        self.emit(LOAD_LOCAL, result)
+
+    def _let(self, expression: Stella.LetContext, tail: bool):
+        for binding in expression.patternBindings:
+            self.expression(binding.rhs)
+            self._bind(binding.pat)
+        self.expression(expression.body, tail)
+
+    def _letrec(self, expression: Stella.LetRecContext, tail: bool):
+        # Every binding is in scope in every right-hand side, so closures capture the bound slots once all are filled
+        slots = []
+
+        def declare(binder: Token) -> int:
+            slots.append(self.declare(binder))
+            return slots[-1]
+
+        plans = [pattern_plan(binding.pat, declare) for binding in expression.patternBindings]
+        for binding, plan in zip(expression.patternBindings, plans):
+            self.expression(binding.rhs)
+            self.emit(MATCH_PATTERN, (plan, None))
+        self.emit(RECAPTURE, tuple(slots))
+        self.expression(expression.body, tail)
+
+    def _bind(self, pattern: Stella.PatternContext):
+        while isinstance(pattern, Stella.ParenthesisedPatternContext):
+            pattern = pattern.pattern_
+        if isinstance(pattern, Stella.PatternVarContext):
+            self.emit(STORE_LOCAL, self.declare(pattern.name))
+        else:
+            self.emit(MATCH_PATTERN, (pattern_plan(pattern, self.declare), None))
+
+    def _match(self, expression: Stella.MatchContext, tail: bool):
+        self.expression(expression.expr_)
+        cases = []
+        match_plan = MatchPlan(match_tree(decision_tree(expression), expression.scrutinee_type), cases)
+        self.emit(MATCH, match_plan)
+        to_end = []
+        for match_case in expression.cases:
+            bindings = pattern_plan(match_case.pattern_, self.declare).bindings
+            cases.append((bindings, self.here()))
+            self.expression(match_case.expr_, tail)
+            to_end.append(self.emit(JUMP))
+        for jump in to_end:
+            self.patch(jump, self.here())
+
+    def _logic_chain(self, expression: Stella.ExprContext):
+        # Short-circuiting: the right operand of and (or) only runs when the value so far is true (false)
+        leftmost, operators = left_spine(expression, (Stella.LogicAndContext, Stella.LogicOrContext))
+        self.expression(leftmost)
+        for operator_ctx in operators:
+            to_short_circuit = self.emit(JUMP_IF_FALSE)
+            if isinstance(operator_ctx, Stella.LogicAndContext):
+                self.expression(operator_ctx.right)
+                to_end = self.emit(JUMP)
+                self.patch(to_short_circuit, self.here())
+                self.emit(CONST, False)
+            else:
+                self.emit(CONST, True)
+                to_end = self.emit(JUMP)
+                self.patch(to_short_circuit, self.here())
+                self.expression(operator_ctx.right)
+            self.patch(to_end, self.here())
+
+    def _try(self, expression: Stella.TryWithContext | Stella.TryCatchContext):
+        to_handler = self.emit(TRY)
+        self.expression(expression.tryExpr)
+        self.emit(END_TRY)
+        to_end = [self.emit(JUMP)]
+        self.patch(to_handler, self.here())
+        if isinstance(expression, Stella.TryWithContext):
+            self.emit(POP)
+            self.expression(expression.fallbackExpr)
+        else:
+            # An exception the pattern does not match is thrown on to the next handler
+            exception_slot = self.new_slot()
+            self.emit(STORE_LOCAL, exception_slot)
+            self.emit(LOAD_LOCAL, exception_slot)
+            plan = pattern_plan(expression.pat, self.declare)
+            to_rethrow = self.emit(MATCH_PATTERN)
+            self.expression(expression.fallbackExpr)
+            to_end.append(self.emit(JUMP))
+            self.patch(to_rethrow, (plan, self.here()))
+            self.emit(LOAD_LOCAL, exception_slot)
+            self.emit(THROW)
+        for jump in to_end:
+            self.patch(jump, self.here())
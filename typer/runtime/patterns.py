@@ -0,0 +1,186 @@
+from typing import NamedTuple
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.decision_tree import Fail, Leaf, SUM, VARIANT, LIST, NAT, NAT_VALUE
+from typer.typecheck.exhaustive_check import (ZERO, SUCC, NIL, CONS, INL, INR, constructor_signature,
+                                              field_types_by_label)
+from typer.typecheck.recursive_types import head_type
+
+# Runtime values: Nat is an int, Bool a bool, Unit None, tuples are tuples, records are dicts keyed by label,
+# injections and variants are (tag, payload) pairs, lists are (head, tail) pairs ending in None, and references are
+# Reference cells. A step selects a sub-value: an index or label into a tuple, pair or record, or PRED for the
+# predecessor of a Nat.
+PRED = object()
+PAYLOAD = 1
+
+Steps = tuple
+
+
+def access(value, steps: Steps):
+    for step in steps:
+        value = value - 1 if step is PRED else value[step]
+    return value
+
+
+# Tests of a pattern plan, each applied to the sub-value at its steps
+EQUALS, TAG, IS_NIL, IS_CONS, AT_LEAST = range(5)
+
+
+class PatternPlan(NamedTuple):
+    tests: tuple[tuple[Steps, int, object], ...]
+    bindings: tuple[tuple[int, Steps], ...]
+
+
+def pattern_plan(pattern: Stella.PatternContext, slot_of) -> PatternPlan:
+    """Flattens a pattern into tests and slot bindings, both in the order a left-to-right match would perform them.
+    slot_of maps the token binding a variable to its frame slot."""
+    tests, bindings = [], []
+    pending = [(pattern, ())]
+    while pending:
+        pattern, steps = pending.pop()
+        match pattern:
+            case Stella.ParenthesisedPatternContext():
+                pending.append((pattern.pattern_, steps))
+            case Stella.PatternVarContext():
+                bindings.append((slot_of(pattern.name), steps))
+            case Stella.PatternTrueContext() | Stella.PatternFalseContext():
+                tests.append((steps, EQUALS, isinstance(pattern, Stella.PatternTrueContext)))
+            case Stella.PatternIntContext():
+                tests.append((steps, EQUALS, int(pattern.n.text)))
+            case Stella.PatternSuccContext():
+                tests.append((steps, AT_LEAST, 1))
+                pending.append((pattern.pattern_, steps + (PRED,)))
+            case Stella.PatternInlContext() | Stella.PatternInrContext():
+                tests.append((steps, TAG, INL if isinstance(pattern, Stella.PatternInlContext) else INR))
+                pending.append((pattern.pattern_, steps + (PAYLOAD,)))
+            case Stella.PatternVariantContext():
+                tests.append((steps, TAG, pattern.label.text))
+                if pattern.pattern_ is not None:
+                    pending.append((pattern.pattern_, steps + (PAYLOAD,)))
+            case Stella.PatternTupleContext():
+                pending.extend((element, steps + (i,)) for i, element in reversed(list(enumerate(pattern.patterns))))
+            case Stella.PatternRecordContext():
+                pending.extend((labelled.pattern_, steps + (labelled.label.text,))
+                               for labelled in reversed(pattern.patterns))
+            case Stella.PatternConsContext():
+                tests.append((steps, IS_CONS, None))
+                pending.append((pattern.tail, steps + (1,)))
+                pending.append((pattern.head, steps + (0,)))
+            case Stella.PatternListContext():
+                element_steps = []
+                for element in pattern.patterns:
+                    tests.append((steps, IS_CONS, None))
+                    element_steps.append((element, steps + (0,)))
+                    steps += (1,)
+                tests.append((steps, IS_NIL, None))
+                pending.extend(reversed(element_steps))
+            case Stella.PatternUnitContext():
+                pass
+    return PatternPlan(tuple(tests), tuple(bindings))
+
+
+def matches(plan: PatternPlan, value) -> bool:
+    for steps, test, expected in plan.tests:
+        sub_value = access(value, steps)
+        if test == EQUALS:
+            if sub_value != expected:
+                return False
+        elif test == TAG:
+            if sub_value[0] != expected:
+                return False
+        elif test == IS_CONS:
+            if sub_value is None:
+                return False
+        elif test == IS_NIL:
+            if sub_value is not None:
+                return False
+        elif sub_value < expected:
+            return False
+    return True
+
+
+# Decision trees of match expressions, with occurrences translated into steps
+
+class SwitchPlan(NamedTuple):
+    steps: Steps
+    kind: str
+    branches: dict
+    default: object
+
+
+class LeafPlan(NamedTuple):
+    case_index: int
+
+
+class MatchPlan(NamedTuple):
+    tree: SwitchPlan | LeafPlan | None
+    # Per case: the slot bindings and the instruction index of its body
+    cases: list[tuple[tuple[tuple[int, Steps], ...], int]]
+
+
+def constructor_of(value, kind: str):
+    if kind == SUM or kind == VARIANT:
+        return value[0]
+    if kind == LIST:
+        return NIL if value is None else CONS
+    if kind == NAT:
+        return SUCC if value else ZERO
+    # Nat literals and Bool values are their own constructors
+    return value
+
+
+def match_tree(tree, scrutinee_type) -> SwitchPlan | LeafPlan | None:
+    """Translates a decision tree into a plan over runtime values. Shared subtrees stay shared."""
+    translated = {}
+
+    def translate(node, occurrence_types: dict):
+        if isinstance(node, Leaf):
+            return LeafPlan(node.case_index)
+        if isinstance(node, Fail):
+            return None
+        # A shared subtree may be reached under different constructors, whose argument types decide the steps
+        key = (id(node), frozenset((occurrence, id(t)) for occurrence, t in occurrence_types.items()))
+        if key in translated:
+            return translated[key]
+        steps, column_type = _occurrence_steps(node.occurrence, occurrence_types)
+        signature = constructor_signature(column_type) if node.kind != NAT_VALUE else {}
+        branches = {}
+        for constructor, subtree in node.branches:
+            branch_types = dict(occurrence_types)
+            for i, argument_type in enumerate(signature.get(constructor, ())):
+                branch_types[node.occurrence + (i,)] = argument_type
+            branches[constructor] = translate(subtree, branch_types)
+        default = translate(node.default, occurrence_types) if node.default is not None else None
+        translated[key] = SwitchPlan(steps, node.kind, branches, default)
+        return translated[key]
+
+    return translate(tree, {(): scrutinee_type})
+
+
+def _occurrence_steps(occurrence: tuple, occurrence_types: dict) -> tuple[Steps, object]:
+    # Types of sub-values below constructors with several alternatives are known from the enclosing switch; below
+    # tuples and records they follow from the enclosing type
+    steps = []
+    current_type = occurrence_types[()]
+    for depth in range(1, len(occurrence) + 1):
+        parent_type = head_type(current_type)
+        index = occurrence[depth - 1]
+        match parent_type:
+            case Stella.TypeRecordContext():
+                label = list(field_types_by_label(parent_type))[index]
+                steps.append(label)
+                child_type = field_types_by_label(parent_type)[label]
+            case Stella.TypeTupleContext():
+                steps.append(index)
+                child_type = parent_type.types[index]
+            case Stella.TypeNatContext():
+                steps.append(PRED)
+                child_type = parent_type
+            case Stella.TypeListContext():
+                steps.append(index)
+                child_type = parent_type.type_ if index == 0 else parent_type
+            case _:
+                steps.append(PAYLOAD)
+                child_type = None
+        current_type = occurrence_types.get(occurrence[:depth], child_type)
+    return tuple(steps), current_type
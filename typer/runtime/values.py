@@ -0,0 +1,66 @@
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.exhaustive_check import INL, field_types_by_label
+from typer.typecheck.recursive_types import head_type
+from typer.runtime.bytecode import Code
+
+
+class Closure:
+    __slots__ = ("code", "free")
+
+    def __init__(self, code: Code, free: tuple):
+        self.code = code
+        self.free = free
+
+
+class FixPoint:
+    """fix f: calling it calls f applied to the fixed point itself. When computing f (fix f) has no effects, as for
+    fix (fn(self) { return fn(...) {...} }), the unrolling is computed once and kept."""
+    __slots__ = ("function", "cache_unrolling", "unrolled")
+
+    def __init__(self, function, cache_unrolling: bool = False):
+        self.function = function
+        self.cache_unrolling = cache_unrolling
+        self.unrolled = None
+
+
+class Reference:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def format_value(value, stella_type: Stella.StellatypeContext) -> str:
+    """Stella syntax for a runtime value of the given type. Must run under the checker state of the program."""
+    stella_type = head_type(stella_type)
+    match stella_type:
+        case Stella.TypeBoolContext():
+            return "true" if value else "false"
+        case Stella.TypeUnitContext():
+            return "unit"
+        case Stella.TypeTupleContext():
+            return "{" + ", ".join(format_value(element, element_type)
+                                   for element, element_type in zip(value, stella_type.types)) + "}"
+        case Stella.TypeRecordContext():
+            return "{" + ", ".join(f"{label} = {format_value(value[label], field_type)}"
+                                   for label, field_type in field_types_by_label(stella_type).items()) + "}"
+        case Stella.TypeSumContext():
+            tag, payload = value
+            payload_type = stella_type.left if tag == INL else stella_type.right
+            return f"{tag}({format_value(payload, payload_type)})"
+        case Stella.TypeVariantContext():
+            label, payload = value
+            payload_type = field_types_by_label(stella_type)[label]
+            return f"<| {label} |>" if payload_type is None else f"<| {label} = {format_value(payload, payload_type)} |>"
+        case Stella.TypeListContext():
+            elements = []
+            while value is not None:
+                head, value = value
+                elements.append(format_value(head, stella_type.type_))
+            return "[" + ", ".join(elements) + "]"
+        case Stella.TypeFunContext() | Stella.TypeForAllContext():
+            return "<fun>"
+        case Stella.TypeRefContext():
+            return "<ref>"
+        case _:
+            return str(value)
@@ -0,0 +1,207 @@
+from typer.runtime.bytecode import *
+from typer.runtime.patterns import access, constructor_of, matches, LeafPlan
+from typer.runtime.values import Closure, FixPoint, Reference
+
+
+class StellaRuntimeError(Exception):
+    pass
+
+
+class PanicError(StellaRuntimeError):
+    def __init__(self, message: str = "panic!") -> None:
+        super().__init__(message)
+
+
+class UncaughtExceptionError(StellaRuntimeError):
+    def __init__(self, value) -> None:
+        super().__init__("uncaught exception")
+        self.value = value
+
+
+class StellaException(Exception):
+    """A value thrown by a Stella program, unwound to the nearest try."""
+
+    def __init__(self, value) -> None:
+        self.value = value
+
+
+# The frame a fixed point's unrolling returns into, applying it to the arguments of the call
+_UNROLL_AND_APPLY = [(APPLY_UNROLLED, None)]
+
+
+class VirtualMachine:
+    def __init__(self, functions: list[Code]):
+        # Top-level functions close over nothing, so each one is a single closure shared by every call
+        self.globals = [Closure(code, ()) for code in functions]
+
+    def call(self, function, arguments: list):
+        try:
+            return self._execute(function, arguments)
+        except StellaException as e:
+            raise UncaughtExceptionError(e.value) from None
+
+    def _execute(self, function, arguments: list):
+        """Runs a call to completion. Calls made by the program push frames onto an explicit frame stack, so the
+        depth of Stella recursion is bounded by memory rather than by the Python stack. Tail calls replace the
+        calling frame, and a fixed point is unrolled by a trampoline frame rather than by a nested run."""
+        stack = [function, *arguments]
+        frames = []
+        handlers = []
+        global_functions = self.globals
+
+        instructions = [(TAIL_CALL, len(arguments))]
+        slots = []
+        free = ()
+        pc = 0
+
+        while True:
+            try:
+                while True:
+                    op, arg = instructions[pc]
+                    pc += 1
+                    if op == LOAD_LOCAL:
+                        stack.append(slots[arg])
+                    elif op == CONST:
+                        stack.append(arg)
+                    elif op == STORE_LOCAL:
+                        slots[arg] = stack.pop()
+                    elif op == LOAD_GLOBAL:
+                        stack.append(global_functions[arg])
+                    elif op == LOAD_FREE:
+                        stack.append(free[arg])
+                    elif op == JUMP_IF_FALSE:
+                        if not stack.pop():
+                            pc = arg
+                    elif op == JUMP:
+                        pc = arg
+                    elif op == FOR_RANGE:
+                        counter, limit, exit_target = arg
+                        if slots[counter] >= slots[limit]:
+                            pc = exit_target
+                    elif op == INCREMENT:
+                        slots[arg] += 1
+                    elif op == BINARY:
+                        right = stack.pop()
+                        stack[-1] = arg(stack[-1], right)
+                    elif op == SUCC:
+                        stack[-1] += 1
+                    elif op == PRED:
+                        if stack[-1]:
+                            stack[-1] -= 1
+                    elif op == IS_ZERO:
+                        stack[-1] = stack[-1] == 0
+                    elif op == NOT:
+                        stack[-1] = not stack[-1]
+                    elif op == CALL or op == TAIL_CALL or op == APPLY_UNROLLED:
+                        if op == APPLY_UNROLLED:
+                            fixpoint, call_arguments = slots
+                            callee = stack.pop()
+                            if fixpoint.cache_unrolling:
+                                fixpoint.unrolled = callee
+                        else:
+                            call_arguments = stack[len(stack) - arg:]
+                            del stack[len(stack) - arg:]
+                            callee = stack.pop()
+                            if op == CALL:
+                                frames.append((instructions, pc, slots, free))
+                        # fix f called with arguments is f (fix f) called with them
+                        while callee.__class__ is FixPoint:
+                            if callee.unrolled is not None:
+                                callee = callee.unrolled
+                            else:
+                                frames.append((_UNROLL_AND_APPLY, 0, [callee, call_arguments], ()))
+                                callee, call_arguments = callee.function, [callee]
+                        code = callee.code
+                        instructions = code.instructions
+                        slots = call_arguments + [None] * (code.local_count - len(call_arguments))
+                        free = callee.free
+                        pc = 0
+                    elif op == RETURN:
+                        if not frames:
+                            return stack.pop()
+                        instructions, pc, slots, free = frames.pop()
+                    elif op == MAKE_CLOSURE:
+                        stack.append(Closure(arg, tuple([slots[index] if is_local else free[index]
+                                                         for is_local, index in arg.captures])))
+                    elif op == RECAPTURE:
+                        for slot in arg:
+                            closure = slots[slot]
+                            if closure.__class__ is Closure:
+                                closure.free = tuple([slots[index] if is_local else free[index]
+                                                      for is_local, index in closure.code.captures])
+                    elif op == MATCH:
+                        scrutinee = stack.pop()
+                        node = arg.tree
+                        while node.__class__ is not LeafPlan:
+                            if node is None:
+                                raise StellaRuntimeError("no match case applies")
+                            value = access(scrutinee, node.steps)
+                            node = node.branches.get(constructor_of(value, node.kind), node.default)
+                        bindings, pc = arg.cases[node.case_index]
+                        for slot, steps in bindings:
+                            slots[slot] = access(scrutinee, steps)
+                    elif op == MATCH_PATTERN:
+                        plan, fail_target = arg
+                        value = stack.pop()
+                        if not matches(plan, value):
+                            if fail_target is None:
+                                raise StellaRuntimeError("pattern does not match")
+                            pc = fail_target
+                            continue
+                        for slot, steps in plan.bindings:
+                            slots[slot] = access(value, steps)
+                    elif op == POP:
+                        stack.pop()
+                    elif op == MAKE_TUPLE:
+                        elements = tuple(stack[len(stack) - arg:])
+                        del stack[len(stack) - arg:]
+                        stack.append(elements)
+                    elif op == GET:
+                        stack[-1] = stack[-1][arg]
+                    elif op == MAKE_RECORD:
+                        record = dict(zip(arg, stack[len(stack) - len(arg):]))
+                        del stack[len(stack) - len(arg):]
+                        stack.append(record)
+                    elif op == MAKE_TAGGED:
+                        stack[-1] = (arg, stack[-1])
+                    elif op == MAKE_LIST:
+                        value = None
+                        for _ in range(arg):
+                            value = (stack.pop(), value)
+                        stack.append(value)
+                    elif op == CONS:
+                        tail = stack.pop()
+                        stack[-1] = (stack[-1], tail)
+                    elif op == HEAD or op == TAIL:
+                        if stack[-1] is None:
+                            raise StellaRuntimeError("head of an empty list" if op == HEAD else "tail of an empty list")
+                        stack[-1] = stack[-1][0 if op == HEAD else 1]
+                    elif op == IS_EMPTY:
+                        stack[-1] = stack[-1] is None
+                    elif op == FIX:
+                        stack[-1] = FixPoint(stack[-1], arg)
+                    elif op == NEW_REF:
+                        stack[-1] = Reference(stack[-1])
+                    elif op == DEREF:
+                        stack[-1] = stack[-1].value
+                    elif op == ASSIGN:
+                        value = stack.pop()
+                        stack.pop().value = value
+                        stack.append(None)
+                    elif op == TRY:
+                        handlers.append((len(frames), len(stack), arg, instructions, slots, free))
+                    elif op == END_TRY:
+                        handlers.pop()
+                    elif op == THROW:
+                        raise StellaException(stack.pop())
+                    elif op == PANIC:
+                        raise PanicError(arg) if arg else PanicError()
+                    else:
+                        raise StellaRuntimeError(f"unknown opcode {op}")
+            except StellaException as e:
+                if not handlers:
+                    raise
+                frame_count, stack_size, pc, instructions, slots, free = handlers.pop()
+                del frames[frame_count:]
+                del stack[stack_size:]
+                stack.append(e.value)
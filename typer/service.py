@@ -0,0 +1,293 @@
+import asyncio
+import json
+import multiprocessing
+import time
+
+from multiprocessing.connection import Connection
+
+from typer.limits import CheckLimits
+from typer.report import check_source
+
+# Checked once by every worker at startup, so that the first request does not pay for imports and parser warm-up
+_WARM_UP_PROGRAM = "language core;\nfn main(n : Nat) -> Nat {\n  return n\n}\n"
+
+_REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    408: "Request Timeout",
+    411: "Length Required",
+    413: "Payload Too Large",
+    429: "Too Many Requests",
+    431: "Request Header Fields Too Large",
+    503: "Service Unavailable",
+    504: "Gateway Timeout",
+}
+
+
+class ServiceConfig:
+    def __init__(self, workers: int = 2, max_request_bytes: int = 1 << 20, check_timeout: float = 10.0,
+                 read_timeout: float = 10.0, queue_size: int = 64, limits: CheckLimits | None = None):
+        self.workers = workers
+        self.max_request_bytes = max_request_bytes
+        self.check_timeout = check_timeout
+        self.read_timeout = read_timeout
+        # Requests that may wait for a free worker; beyond that, requests are turned away with 429
+        self.queue_size = queue_size
+        # Enforced inside the worker, which then answers with the limit_exceeded verdict; check_timeout remains the
+        # backstop for a worker that does not come back
+        self.limits = limits
+
+
+def _worker_main(connection: Connection, limits: CheckLimits | None):
+    check_source(_WARM_UP_PROGRAM)
+    connection.send("ready")
+    while True:
+        source = connection.recv()
+        if source is None:
+            return
+        connection.send(check_source(source, limits=limits))
+
+
+class _Worker:
+    # Spawned rather than forked, so workers inherit neither the event loop nor the listening socket
+    _context = multiprocessing.get_context("spawn")
+
+    def __init__(self, limits: CheckLimits | None):
+        self.connection, worker_end = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(worker_end, limits), daemon=True)
+        self.process.start()
+        worker_end.close()
+
+    async def receive(self):
+        """Waits for the worker's next message without blocking the event loop."""
+        loop = asyncio.get_running_loop()
+        received = loop.create_future()
+        fileno = self.connection.fileno()
+        loop.add_reader(fileno, lambda: received.done() or received.set_result(None))
+        try:
+            await received
+        finally:
+            loop.remove_reader(fileno)
+        return self.connection.recv()
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+        self.connection.close()
+
+
+class CheckTimeout(Exception):
+    pass
+
+
+class WorkerPool:
+    """Warm worker processes, each checking one program at a time. A check that runs out of time kills its worker,
+    which is replaced by a new one."""
+
+    def __init__(self, size: int, limits: CheckLimits | None = None):
+        self.size = size
+        self.limits = limits
+        self.idle: asyncio.Queue[_Worker] = asyncio.Queue()
+        self.workers: list[_Worker] = []
+        self.waiting = 0
+
+    async def start(self):
+        await asyncio.gather(*(self._add_worker() for _ in range(self.size)))
+
+    async def _add_worker(self):
+        worker = _Worker(self.limits)
+        self.workers.append(worker)
+        await worker.receive()
+        self.idle.put_nowait(worker)
+
+    async def check(self, source: str, timeout: float) -> dict:
+        self.waiting += 1
+        try:
+            worker = await self.idle.get()
+        finally:
+            self.waiting -= 1
+        try:
+            worker.connection.send(source)
+            record = await asyncio.wait_for(worker.receive(), timeout)
+        except (asyncio.TimeoutError, EOFError, OSError) as e:
+            self.workers.remove(worker)
+            worker.kill()
+            asyncio.get_running_loop().create_task(self._add_worker())
+            if isinstance(e, asyncio.TimeoutError):
+                raise CheckTimeout() from None
+            raise
+        self.idle.put_nowait(worker)
+        return record
+
+    def stop(self):
+        for worker in self.workers:
+            worker.stop()
+
+
+class Metrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.responses: dict[int, int] = {}
+        self.verdicts: dict[str, int] = {}
+        self.check_seconds_total = 0.0
+        self.checks = 0
+
+    def render(self, pool: WorkerPool) -> str:
+        # Prometheus text exposition format
+        lines = [f"typer_uptime_seconds {time.monotonic() - self.started:.3f}",
+                 f"typer_workers {len(pool.workers)}",
+                 f"typer_workers_idle {pool.idle.qsize()}",
+                 f"typer_queue_waiting {pool.waiting}",
+                 f"typer_checks_total {self.checks}",
+                 f"typer_check_seconds_total {self.check_seconds_total:.6f}"]
+        lines += [f'typer_responses_total{{status="{status}"}} {count}'
+                  for status, count in sorted(self.responses.items())]
+        lines += [f'typer_verdicts_total{{verdict="{verdict}"}} {count}'
+                  for verdict, count in sorted(self.verdicts.items())]
+        return "\n".join(lines) + "\n"
+
+
+class _HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        self.status = status
+        self.message = message
+
+
+class CheckService:
+    """HTTP front end of the checker. POST /check takes a program as the request body (or a JSON object with a
+    "source" field) and answers with its check record; GET /health and GET /metrics report on the service."""
+
+    def __init__(self, config: ServiceConfig):
+        self.config = config
+        self.pool = WorkerPool(config.workers, config.limits)
+        self.metrics = Metrics()
+
+    async def serve(self, host: str, port: int, ready: asyncio.Event | None = None):
+        await self.pool.start()
+        server = await asyncio.start_server(self._handle_connection, host, port)
+        try:
+            async with server:
+                if ready is not None:
+                    ready.set()
+                await server.serve_forever()
+        finally:
+            self.pool.stop()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            try:
+                method, path, headers = await asyncio.wait_for(self._read_head(reader), self.config.read_timeout)
+                status, content_type, body = await self._route(method, path, headers, reader)
+            except _HttpError as e:
+                status, content_type, body = e.status, "application/json", json.dumps({"error": e.message})
+            except asyncio.TimeoutError:
+                status, content_type, body = 408, "application/json", json.dumps({"error": "request timed out"})
+            await self._respond(writer, status, content_type, body)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader: asyncio.StreamReader) -> tuple[str, str, dict]:
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.LimitOverrunError:
+            raise _HttpError(431, "request head too large") from None
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, path, _ = request_line.split(" ", 2)
+        except ValueError:
+            raise _HttpError(400, "malformed request line") from None
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(":")
+                headers[name.strip().lower()] = value.strip()
+        return method, path.split("?", 1)[0], headers
+
+    async def _route(self, method: str, path: str, headers: dict, reader: asyncio.StreamReader):
+        if path == "/health":
+            if method != "GET":
+                raise _HttpError(405, "use GET")
+            status = 200 if self.pool.workers else 503
+            return status, "application/json", json.dumps({"status": "ok" if status == 200 else "starting",
+                                                            "workers": len(self.pool.workers),
+                                                            "idle": self.pool.idle.qsize()})
+        if path == "/metrics":
+            if method != "GET":
+                raise _HttpError(405, "use GET")
+            return 200, "text/plain; version=0.0.4", self.metrics.render(self.pool)
+        if path != "/check":
+            raise _HttpError(404, "unknown path")
+        if method != "POST":
+            raise _HttpError(405, "use POST")
+
+        if "content-length" not in headers:
+            raise _HttpError(411, "Content-Length required")
+        try:
+            length = int(headers["content-length"])
+        except ValueError:
+            raise _HttpError(400, "malformed Content-Length") from None
+        if length > self.config.max_request_bytes:
+            raise _HttpError(413, f"program larger than {self.config.max_request_bytes} bytes")
+        body = await asyncio.wait_for(reader.readexactly(length), self.config.read_timeout)
+        source = self._source(body, headers.get("content-type", ""))
+
+        # Nothing yields between this test and the pool counting the request as waiting
+        if self.pool.waiting >= self.config.queue_size:
+            raise _HttpError(429, "too many programs waiting to be checked")
+        started = time.perf_counter()
+        try:
+            record = await self.pool.check(source, self.config.check_timeout)
+        except CheckTimeout:
+            raise _HttpError(504, f"checking took longer than {self.config.check_timeout} seconds") from None
+        except (EOFError, OSError):
+            raise _HttpError(503, "the checker worker failed") from None
+        self.metrics.checks += 1
+        self.metrics.check_seconds_total += time.perf_counter() - started
+        self.metrics.verdicts[record["verdict"]] = self.metrics.verdicts.get(record["verdict"], 0) + 1
+        return 200, "application/json", json.dumps(record)
+
+    @staticmethod
+    def _source(body: bytes, content_type: str) -> str:
+        try:
+            text = body.decode("utf-8")
+            if content_type.startswith("application/json"):
+                source = json.loads(text)["source"]
+                if not isinstance(source, str):
+                    raise TypeError(source)
+                return source
+            return text
+        except (UnicodeDecodeError, ValueError, KeyError, TypeError):
+            raise _HttpError(400, "expected a UTF-8 program, or a JSON object with a \"source\" string") from None
+
+    async def _respond(self, writer: asyncio.StreamWriter, status: int, content_type: str, body: str):
+        self.metrics.responses[status] = self.metrics.responses.get(status, 0) + 1
+        payload = body.encode("utf-8")
+        head = (f"HTTP/1.1 {status} {_REASONS[status]}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\n"
+                + ("Retry-After: 1\r\n" if status == 429 else "")
+                + "Connection: close\r\n\r\n")
+        writer.write(head.encode("latin-1") + payload)
+        await writer.drain()
+
+
+def serve(host: str = "127.0.0.1", port: int = 8080, config: ServiceConfig | None = None) -> int:
+    try:
+        asyncio.run(CheckService(config or ServiceConfig()).serve(host, port))
+    except KeyboardInterrupt:
+        pass
+    return 0
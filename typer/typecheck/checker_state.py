@@ -0,0 +1,62 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from typer.typecheck.type_error import StellaTypeError
+
+
+class CheckerState:
+    def __init__(self, extensions: set[str] = frozenset()):
+        self.extensions = extensions
+        self.warnings: list[StellaTypeError] = []
+        self.type_reconstruction = "#type-reconstruction" in extensions
+        self.let_polymorphism = self.type_reconstruction and "#let-polymorphism" in extensions
+        self.structural_subtyping = "#structural-subtyping" in extensions
+        self.equirecursive_types = "#equirecursive-types" in extensions
+        self.type_variables = []
+        self.current_level = 0
+        self.type_aliases = {}
+        self.alias_expansions = {}
+        self.exception_type = None
+        self.subtype_cache = {}
+        self.equivalent_types = {}
+        # (start offset, stop offset, type) per checked expression, when the program's types are being recorded
+        self.type_records: list | None = None
+
+    @property
+    def compares_every_type(self) -> bool:
+        # Outside the default mode even checks that only look at the kind of a type go through compare_types
+        return self.type_reconstruction or self.structural_subtyping
+
+    @contextmanager
+    def deeper_level(self):
+        self.current_level += 1
+        try:
+            yield
+        finally:
+            self.current_level -= 1
+
+
+_checker_state: ContextVar[CheckerState] = ContextVar("checker_state")
+
+
+def checker_state() -> CheckerState:
+    return _checker_state.get()
+
+
+def active_checker_state() -> CheckerState | None:
+    return _checker_state.get(None)
+
+
+@contextmanager
+def new_checker_state(extensions: set[str] = frozenset()):
+    with activate_checker_state(CheckerState(extensions)) as state:
+        yield state
+
+
+@contextmanager
+def activate_checker_state(state: CheckerState):
+    token = _checker_state.set(state)
+    try:
+        yield state
+    finally:
+        _checker_state.reset(token)
@@ -1,31 +1,39 @@
 from typer.typecheck.type_error import *
+from typer.typecheck.checker_state import checker_state
+from typer.typecheck.unify import unify
+from typer.typecheck.substitute import substitute, type_variable
+from typer.typecheck.type_format import format_type
+from typer.typecheck.subtyping import check_subtype
+from typer.typecheck.exhaustive_check import field_types_by_label
+from typer.typecheck.recursive_types import check_type_equivalence, head_type
 from typer.grammar.stellaParser import stellaParser as Stella
 
 
 def unwind_parens(parens_type: Stella.StellatypeContext):
-    while isinstance(parens_type, Stella.TypeParensContext):
-        parens_type = parens_type.type_
-    return parens_type
+    return head_type(parens_type)
 
 
 def compare_types(expected: Stella.StellatypeContext, actual: Stella.StellatypeContext):
     if not expected:
         return True
+    state = checker_state()
+    if state.type_reconstruction:
+        unify(expected, actual)
+        return True
+    if state.structural_subtyping:
+        check_subtype(actual, expected)
+        return True
+    if state.equirecursive_types:
+        check_type_equivalence(expected, actual)
+        return True
     expected = unwind_parens(expected)
     actual = unwind_parens(actual)
+    if expected is actual:
+        return True
     if type(expected) is not type(actual):
-        match expected:
-            case Stella.TypeFunContext():
-                raise UnexpectedLambdaError(actual)
-            case Stella.TypeTupleContext():
-                raise UnexpectedTupleError(actual)
-            case Stella.TypeRecordContext():
-                raise UnexpectedRecordError(actual)
-            case Stella.TypeListContext():
-                raise UnexpectedListError(actual)
-            case _:
-                raise UnexpectedTypeError(type(expected), type(actual))
-    elif isinstance(expected, Stella.TypeListContext):
+        raise type_mismatch_error(expected, actual)
+    elif isinstance(expected, (Stella.TypeListContext, Stella.TypeRefContext)):
+        # Comparison is equality, so references are invariant in their content type
         return compare_types(expected.type_, actual.type_)
     elif isinstance(expected, Stella.TypeTupleContext):
         if len(expected.types) != len(actual.types):
@@ -33,15 +41,30 @@ def compare_types(expected: Stella.StellatypeContext, actual: Stella.StellatypeC
         for expected_type, actual_type in zip(expected.types, actual.types):
             compare_types(expected_type, actual_type)
     elif isinstance(expected, Stella.TypeRecordContext):
-        if len(expected.fieldTypes) < len(actual.fieldTypes):
+        expected_fields, actual_fields = field_types_by_label(expected), field_types_by_label(actual)
+        if actual_fields.keys() - expected_fields.keys():
             raise UnexpectedRecordFieldsError
-        if len(expected.fieldTypes) > len(actual.fieldTypes):
+        if expected_fields.keys() - actual_fields.keys():
             raise MissingRecordFieldsError
-        for expected_field, actual_field in zip(expected.fieldTypes, actual.fieldTypes):
+        for label, expected_field in expected_fields.items():
             try:
-                compare_types(expected_field, actual_field)
+                compare_types(expected_field, actual_fields[label])
             except StellaTypeError:
                 raise UnexpectedRecordFieldsError
+    elif isinstance(expected, Stella.TypeVarContext):
+        if expected.name.text != actual.name.text:
+            raise UnexpectedTypeError(format_type(expected), format_type(actual))
+    elif isinstance(expected, Stella.TypeForAllContext):
+        if len(expected.types) != len(actual.types):
+            raise UnexpectedTypeError(format_type(expected), format_type(actual))
+        renamed_actual = substitute(actual.type_, {
+            actual_name.text: type_variable(expected_name.text, expected.parser)
+            for expected_name, actual_name in zip(expected.types, actual.types)
+        })
+        return compare_types(expected.type_, renamed_actual)
+    elif isinstance(expected, Stella.TypeRecContext):
+        renamed_actual = substitute(actual.type_, {actual.var.text: type_variable(expected.var.text, expected.parser)})
+        return compare_types(expected.type_, renamed_actual)
     elif isinstance(expected, Stella.TypeParensContext):
         return compare_types(expected.type_, actual.type_)
     return True
@@ -0,0 +1,175 @@
+import heapq
+
+from typing import NamedTuple
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.compare_types import unwind_parens
+from typer.typecheck.exhaustive_check import (WILDCARD, constructor_signature, field_types_by_label, split_column,
+                                              specialize_rows)
+
+# An occurrence is the path from the scrutinee to a sub-value: the i-th element of an occurrence selects the i-th
+# constructor argument (inl/inr/variant payload, succ predecessor, cons head and tail, tuple and record fields in
+# type order).
+Occurrence = tuple[int, ...]
+
+
+class Leaf(NamedTuple):
+    case_index: int
+    bindings: tuple[tuple[str, Occurrence], ...]
+
+
+class Fail(NamedTuple):
+    pass
+
+
+class Switch(NamedTuple):
+    occurrence: Occurrence
+    kind: str
+    branches: tuple[tuple[object, 'DecisionTree'], ...]
+    default: 'DecisionTree | None'
+
+
+DecisionTree = Leaf | Fail | Switch
+
+SUM, VARIANT, LIST, NAT, NAT_VALUE, BOOL = "sum", "variant", "list", "nat", "nat_value", "bool"
+
+
+def decision_tree(match_ctx: Stella.MatchContext) -> DecisionTree:
+    """Decision tree of a type checked match expression, compiled on first use and cached on the node."""
+    try:
+        return match_ctx.compiled_decision_tree
+    except AttributeError:
+        pass
+    try:
+        scrutinee_type, case_patterns = match_ctx.scrutinee_type, match_ctx.case_patterns
+    except AttributeError:
+        raise ValueError("Match expression has not been type checked") from None
+
+    bindings = [tuple(pattern_bindings(case.pattern_, scrutinee_type, ())) for case in match_ctx.cases]
+    rows = [(pattern, i) for i, pattern in enumerate(case_patterns)]
+    match_ctx.compiled_decision_tree = _TreeBuilder(bindings).compile(rows, ((),), (scrutinee_type,))
+    return match_ctx.compiled_decision_tree
+
+
+def pattern_bindings(pattern: Stella.PatternContext, pattern_type: Stella.StellatypeContext, occurrence: Occurrence):
+    pattern_type = unwind_parens(pattern_type)
+    match pattern:
+        case Stella.ParenthesisedPatternContext():
+            yield from pattern_bindings(pattern.pattern_, pattern_type, occurrence)
+        case Stella.PatternVarContext():
+            yield pattern.name.text, occurrence
+        case Stella.PatternSuccContext():
+            yield from pattern_bindings(pattern.pattern_, pattern_type, occurrence + (0,))
+        case Stella.PatternInlContext():
+            yield from pattern_bindings(pattern.pattern_, pattern_type.left, occurrence + (0,))
+        case Stella.PatternInrContext():
+            yield from pattern_bindings(pattern.pattern_, pattern_type.right, occurrence + (0,))
+        case Stella.PatternVariantContext() if pattern.pattern_ is not None:
+            field_type = field_types_by_label(pattern_type)[pattern.label.text]
+            yield from pattern_bindings(pattern.pattern_, field_type, occurrence + (0,))
+        case Stella.PatternTupleContext():
+            for i, (element, element_type) in enumerate(zip(pattern.patterns, pattern_type.types)):
+                yield from pattern_bindings(element, element_type, occurrence + (i,))
+        case Stella.PatternRecordContext():
+            field_types = field_types_by_label(pattern_type)
+            field_indices = {label: i for i, label in enumerate(field_types)}
+            for labelled_pattern in pattern.patterns:
+                label = labelled_pattern.label.text
+                yield from pattern_bindings(labelled_pattern.pattern_, field_types[label],
+                                            occurrence + (field_indices[label],))
+        case Stella.PatternListContext():
+            for element in pattern.patterns:
+                yield from pattern_bindings(element, pattern_type.type_, occurrence + (0,))
+                occurrence += (1,)
+        case Stella.PatternConsContext():
+            yield from pattern_bindings(pattern.head, pattern_type.type_, occurrence + (0,))
+            yield from pattern_bindings(pattern.tail, pattern_type, occurrence + (1,))
+
+
+def _switch_kind(column_type: Stella.StellatypeContext) -> str | None:
+    match unwind_parens(column_type):
+        case Stella.TypeSumContext():
+            return SUM
+        case Stella.TypeVariantContext():
+            return VARIANT
+        case Stella.TypeListContext():
+            return LIST
+        case Stella.TypeNatContext():
+            return NAT
+        case Stella.TypeBoolContext():
+            return BOOL
+        case _:
+            # Tuples, records and Unit have a single constructor and need no test
+            return None
+
+
+class _TreeBuilder:
+    def __init__(self, bindings: list[tuple]):
+        self.bindings = bindings
+        self.interned = {}
+
+    def intern(self, key, make):
+        # Structurally equal subtrees are built once and shared; children are already interned,
+        # so comparing them by identity is enough
+        node = self.interned.get(key)
+        if node is None:
+            node = self.interned[key] = make()
+        return node
+
+    def compile(self, rows: list[tuple], occurrences: tuple, column_types: tuple) -> DecisionTree:
+        if not rows:
+            return self.intern(("fail",), Fail)
+
+        first_row = rows[0]
+        column = next((i for i in range(len(column_types)) if first_row[i] is not WILDCARD), None)
+        if column is None:
+            case_index = first_row[-1]
+            return self.intern(("leaf", case_index), lambda: Leaf(case_index, self.bindings[case_index]))
+
+        if column:
+            rows = [(row[column],) + row[:column] + row[column + 1:] for row in rows]
+            occurrences = (occurrences[column],) + occurrences[:column] + occurrences[column + 1:]
+            column_types = (column_types[column],) + column_types[:column] + column_types[column + 1:]
+
+        occurrence, rest_occurrences = occurrences[0], occurrences[1:]
+        column_type, rest_types = column_types[0], column_types[1:]
+        signature = constructor_signature(column_type)
+        by_constructor, wildcard_rows = split_column(rows)
+        kind = _switch_kind(column_type)
+
+        if kind == NAT and all(type(row[0]) is int for row in rows if row[0] is not WILDCARD):
+            return self._compile_nat_values(rows, occurrence, rest_occurrences, rest_types)
+
+        branches = []
+        for constructor, argument_types in signature.items():
+            if constructor not in by_constructor:
+                continue
+            arity = len(argument_types)
+            specialized = specialize_rows(by_constructor[constructor], wildcard_rows, arity)
+            sub_occurrences = tuple(occurrence + (i,) for i in range(arity))
+            subtree = self.compile(specialized, sub_occurrences + rest_occurrences, argument_types + rest_types)
+            if kind is None:
+                return subtree
+            branches.append((constructor, subtree))
+
+        default = None
+        if len(by_constructor) < len(signature):
+            default = self.compile([row[1:] for row in wildcard_rows], rest_occurrences, rest_types)
+        return self._switch(occurrence, kind, tuple(branches), default)
+
+    def _compile_nat_values(self, rows: list[tuple], occurrence: Occurrence, rest_occurrences: tuple,
+                            rest_types: tuple) -> DecisionTree:
+        by_value, wildcard_rows = {}, []
+        for row in rows:
+            (wildcard_rows if row[0] is WILDCARD else by_value.setdefault(row[0], [])).append(row[1:])
+        branches = []
+        for value in sorted(by_value):
+            specialized = list(heapq.merge(by_value[value], wildcard_rows, key=lambda row: row[-1]))
+            branches.append((value, self.compile(specialized, rest_occurrences, rest_types)))
+        default = self.compile(wildcard_rows, rest_occurrences, rest_types)
+        return self._switch(occurrence, NAT_VALUE, tuple(branches), default)
+
+    def _switch(self, occurrence: Occurrence, kind: str, branches: tuple, default: DecisionTree | None):
+        key = ("switch", occurrence, kind, tuple((constructor, id(subtree)) for constructor, subtree in branches),
+               id(default))
+        return self.intern(key, lambda: Switch(occurrence, kind, branches, default))
@@ -1,52 +1,253 @@
+import heapq
+
 from typer.grammar.stellaParser import stellaParser as Stella
-from typer.typecheck.type_error import UnexpectedPatternForTypeError, NonExhaustiveMatchError
+from typer.typecheck.type_error import (UnexpectedPatternForTypeError, NonExhaustiveMatchError,
+                                       AmbiguousPatternTypeError)
+from typer.typecheck.type_map import TypeMap
+from typer.typecheck.recursive_types import head_type
+from typer.typecheck.unify import fresh_type_variable, is_unbound, unify
+
+# Patterns are normalized into a small constructor form before building the pattern matrix:
+#   WILDCARD           - variable pattern, matches anything
+#   (ctor, args)       - constructor with a tuple of normalized sub-patterns
+#   int                - Nat literal; a column of literals is split on their values, while literals next to succ
+#                        patterns are unfolded into succ/zero lazily on specialization
+WILDCARD = None
+
+ZERO, SUCC = "zero", "succ"
+NIL, CONS = "nil", "cons"
+INL, INR = "inl", "inr"
+TUPLE, RECORD, UNIT = "tuple", "record", "unit"
+
+
+def field_types_by_label(fields_type: Stella.TypeVariantContext | Stella.TypeRecordContext) -> dict:
+    # Computed once per type node, so wide variants are not re-indexed for every match case
+    try:
+        return fields_type.field_types_by_label
+    except AttributeError:
+        fields_type.field_types_by_label = {field.label.text: field.type_ for field in fields_type.fieldTypes}
+        return fields_type.field_types_by_label
+
+
+def check_pattern(pattern: Stella.PatternContext, pattern_type: Stella.StellatypeContext, scope_types: TypeMap):
+    pattern_type = head_type(pattern_type)
+    if is_unbound(pattern_type) and not isinstance(pattern, (Stella.PatternVarContext,
+                                                             Stella.ParenthesisedPatternContext)):
+        shape = _pattern_shape(pattern)
+        unify(pattern_type, shape)
+        pattern_type = shape
+    match pattern:
+        case Stella.ParenthesisedPatternContext():
+            return check_pattern(pattern.pattern_, pattern_type, scope_types)
+        case Stella.PatternVarContext():
+            scope_types.insert(pattern.name, pattern_type)
+            return WILDCARD
+        case Stella.PatternTrueContext() if isinstance(pattern_type, Stella.TypeBoolContext):
+            return True, ()
+        case Stella.PatternFalseContext() if isinstance(pattern_type, Stella.TypeBoolContext):
+            return False, ()
+        case Stella.PatternUnitContext() if isinstance(pattern_type, Stella.TypeUnitContext):
+            return UNIT, ()
+        case Stella.PatternIntContext() if isinstance(pattern_type, Stella.TypeNatContext):
+            return int(pattern.n.text)
+        case Stella.PatternSuccContext() if isinstance(pattern_type, Stella.TypeNatContext):
+            return SUCC, (check_pattern(pattern.pattern_, pattern_type, scope_types),)
+        case Stella.PatternInlContext() if isinstance(pattern_type, Stella.TypeSumContext):
+            return INL, (check_pattern(pattern.pattern_, pattern_type.left, scope_types),)
+        case Stella.PatternInrContext() if isinstance(pattern_type, Stella.TypeSumContext):
+            return INR, (check_pattern(pattern.pattern_, pattern_type.right, scope_types),)
+        case Stella.PatternVariantContext() if isinstance(pattern_type, Stella.TypeVariantContext):
+            return _check_variant_pattern(pattern, pattern_type, scope_types)
+        case Stella.PatternTupleContext() if isinstance(pattern_type, Stella.TypeTupleContext):
+            if len(pattern.patterns) != len(pattern_type.types):
+                raise UnexpectedPatternForTypeError(type(pattern), type(pattern_type))
+            return TUPLE, tuple(check_pattern(p, t, scope_types) for p, t in zip(pattern.patterns, pattern_type.types))
+        case Stella.PatternRecordContext() if isinstance(pattern_type, Stella.TypeRecordContext):
+            return _check_record_pattern(pattern, pattern_type, scope_types)
+        case Stella.PatternListContext() if isinstance(pattern_type, Stella.TypeListContext):
+            result = (NIL, ())
+            for element in reversed(pattern.patterns):
+                result = (CONS, (check_pattern(element, pattern_type.type_, scope_types), result))
+            return result
+        case Stella.PatternConsContext() if isinstance(pattern_type, Stella.TypeListContext):
+            return CONS, (check_pattern(pattern.head, pattern_type.type_, scope_types),
+                          check_pattern(pattern.tail, pattern_type, scope_types))
+        case _:
+            raise UnexpectedPatternForTypeError(type(pattern), type(pattern_type))
+
+
+def _pattern_shape(pattern: Stella.PatternContext) -> Stella.StellatypeContext:
+    # Type reconstruction: the type of a scrutinee that is still a type variable follows from the pattern shape
+    match pattern:
+        case Stella.PatternTrueContext() | Stella.PatternFalseContext():
+            return Stella.TypeBoolContext(pattern.parser, pattern)
+        case Stella.PatternUnitContext():
+            return Stella.TypeUnitContext(pattern.parser, pattern)
+        case Stella.PatternIntContext() | Stella.PatternSuccContext():
+            return Stella.TypeNatContext(pattern.parser, pattern)
+        case Stella.PatternInlContext() | Stella.PatternInrContext():
+            shape = Stella.TypeSumContext(pattern.parser, pattern)
+            shape.left, shape.right = fresh_type_variable(), fresh_type_variable()
+            return shape
+        case Stella.PatternListContext() | Stella.PatternConsContext():
+            shape = Stella.TypeListContext(pattern.parser, pattern)
+            shape.type_ = fresh_type_variable()
+            return shape
+        case Stella.PatternTupleContext():
+            shape = Stella.TypeTupleContext(pattern.parser, pattern)
+            shape.types = [fresh_type_variable() for _ in pattern.patterns]
+            return shape
+        case _:
+            raise AmbiguousPatternTypeError(pattern.getText())
+
+
+def _check_variant_pattern(pattern: Stella.PatternVariantContext, variant_type: Stella.TypeVariantContext,
+                           scope_types: TypeMap):
+    field_types = field_types_by_label(variant_type)
+    label = pattern.label.text
+    if label not in field_types:
+        raise UnexpectedPatternForTypeError(label, type(variant_type))
+    field_type = field_types[label]
+    if (pattern.pattern_ is None) != (field_type is None):
+        raise UnexpectedPatternForTypeError(label, type(variant_type))
+    if pattern.pattern_ is None:
+        return label, ()
+    return label, (check_pattern(pattern.pattern_, field_type, scope_types),)
+
+
+def _check_record_pattern(pattern: Stella.PatternRecordContext, record_type: Stella.TypeRecordContext,
+                          scope_types: TypeMap):
+    field_patterns = {}
+    for labelled_pattern in pattern.patterns:
+        field_patterns[labelled_pattern.label.text] = labelled_pattern.pattern_
+    field_types = field_types_by_label(record_type)
+    if not field_patterns.keys() <= field_types.keys():
+        raise UnexpectedPatternForTypeError(type(pattern), type(record_type))
 
+    return RECORD, tuple(
+        check_pattern(field_patterns[label], field_type, scope_types) if label in field_patterns else WILDCARD
+        for label, field_type in field_types.items()
+    )
 
-def create_case_type_getter(match_expression: Stella.StellatypeContext, case_map):
-    match match_expression:
+
+def constructor_signature(pattern_type: Stella.StellatypeContext) -> dict:
+    """Maps every constructor of the type to the types of its arguments; empty for types without constructors."""
+    pattern_type = head_type(pattern_type)
+    match pattern_type:
+        case Stella.TypeBoolContext():
+            return {True: (), False: ()}
+        case Stella.TypeUnitContext():
+            return {UNIT: ()}
+        case Stella.TypeNatContext():
+            return {ZERO: (), SUCC: (pattern_type,)}
         case Stella.TypeSumContext():
-            return lambda pattern: case_map[type(pattern)]
+            return {INL: (pattern_type.left,), INR: (pattern_type.right,)}
         case Stella.TypeVariantContext():
-            return lambda pattern: case_map[pattern.label.text]
+            return {label: (field_type,) if field_type else ()
+                    for label, field_type in field_types_by_label(pattern_type).items()}
+        case Stella.TypeTupleContext():
+            return {TUPLE: tuple(pattern_type.types)}
+        case Stella.TypeRecordContext():
+            return {RECORD: tuple(field_types_by_label(pattern_type).values())}
+        case Stella.TypeListContext():
+            return {NIL: (), CONS: (pattern_type.type_, pattern_type)}
+        case _:
+            return {}
 
 
-def exhaustive_check(match_expression: Stella.StellatypeContext, match_cases: list[Stella.MatchCaseContext]) -> dict:
-    match match_expression:
-        case Stella.TypeSumContext() as sum_type:
-            return _check_match_sum_type(sum_type, match_cases)
-        case Stella.TypeVariantContext() as variant_type:
-            return _check_match_variant_type(variant_type, match_cases)
-        case _:
-            raise NotImplementedError(f"Pattern matching for {type(match_expression)}")
+def head_constructor(pattern):
+    if type(pattern) is int:
+        return SUCC if pattern else ZERO
+    return pattern[0] if pattern is not WILDCARD else None
 
 
-def _check_match_sum_type(match_expression: Stella.TypeSumContext, match_cases: list[Stella.MatchCaseContext]):
-    sum_type_cases = {Stella.PatternInlContext: match_expression.left, Stella.PatternInrContext: match_expression.right}
+def specialize(pattern, arity: int) -> tuple:
+    """Sub-patterns of a pattern whose head constructor is already known to match."""
+    if pattern is WILDCARD:
+        return (WILDCARD,) * arity
+    if type(pattern) is int:
+        return (pattern - 1,) if pattern else ()
+    return pattern[1]
 
-    actual_cases = set()
-    for pattern in map(lambda c: c.pattern_, match_cases):
-        if type(pattern) not in sum_type_cases:
-            raise UnexpectedPatternForTypeError(type(pattern), Stella.TypeSumContext)
-        actual_cases.add(type(pattern))
 
-    if actual_cases != set(sum_type_cases.keys()):
-        raise NonExhaustiveMatchError
+def split_column(rows: list[tuple]) -> tuple[dict, list]:
+    """Groups rows by the head constructor of their first column in a single pass."""
+    by_constructor, wildcard_rows = {}, []
+    for row in rows:
+        constructor = head_constructor(row[0])
+        if constructor is None:
+            wildcard_rows.append(row)
+        else:
+            by_constructor.setdefault(constructor, []).append(row)
+    return by_constructor, wildcard_rows
 
-    return sum_type_cases
 
+def specialize_rows(constructor_rows: list[tuple], wildcard_rows: list[tuple], arity: int) -> list[tuple]:
+    """Specialized matrix for one constructor; rows keep their original order, tracked by the trailing case index."""
+    specialized = [specialize(row[0], arity) + row[1:] for row in constructor_rows]
+    if not wildcard_rows:
+        return specialized
+    return list(heapq.merge(specialized, [(WILDCARD,) * arity + row[1:] for row in wildcard_rows],
+                            key=lambda row: row[-1]))
 
-def _check_match_variant_type(variant_type: Stella.TypeVariantContext, match_cases: list[Stella.MatchCaseContext]):
-    variant_type_cases = {field.label.text: field.type_ for field in variant_type.fieldTypes}
 
-    actual_cases = set()
-    for pattern in map(lambda c: c.pattern_, match_cases):
-        if not isinstance(pattern, Stella.PatternVariantContext):
-            raise UnexpectedPatternForTypeError(pattern, Stella.TypeVariantContext)
-        if pattern.label.text not in variant_type_cases:
-            raise UnexpectedPatternForTypeError(pattern.label.text, Stella.TypeVariantContext)
-        actual_cases.add(pattern.label.text)
+def compute_usefulness(rows: list[tuple], column_types: tuple, reachable_rows: set) -> bool:
+    """Maranget's usefulness of the all-wildcards vector: is some value not matched by any row?
 
-    if actual_cases != set(variant_type_cases.keys()):
-        raise NonExhaustiveMatchError
+    Each row carries its case index as the last element. The matrix is split on every constructor present in the
+    first column plus the default matrix when the column signature is incomplete, so each leaf of the split stands
+    for values on which all rows agree and its first row is the case that fires there.
+    """
+    if not rows:
+        return True
+    if not column_types:
+        reachable_rows.add(rows[0][0])
+        return False
+
+    column_type, rest_types = column_types[0], column_types[1:]
+    if _only_nat_literals(rows):
+        return _nat_literal_usefulness(rows, rest_types, reachable_rows)
+    signature = constructor_signature(column_type)
+    by_constructor, wildcard_rows = split_column(rows)
+
+    useful = False
+    for constructor, constructor_rows in by_constructor.items():
+        argument_types = signature[constructor]
+        specialized = specialize_rows(constructor_rows, wildcard_rows, len(argument_types))
+        useful |= compute_usefulness(specialized, argument_types + rest_types, reachable_rows)
 
-    return variant_type_cases
+    # Some constructor is missing from the column, so only the default matrix can cover it
+    if not signature or len(by_constructor) < len(signature):
+        useful |= compute_usefulness([row[1:] for row in wildcard_rows], rest_types, reachable_rows)
+    return useful
+
+
+def _only_nat_literals(rows: list[tuple]) -> bool:
+    literal = False
+    for row in rows:
+        if type(row[0]) is int:
+            literal = True
+        elif row[0] is not WILDCARD:
+            return False
+    return literal
+
+
+def _nat_literal_usefulness(rows: list[tuple], rest_types: tuple, reachable_rows: set) -> bool:
+    # Literals are constructors of an infinite signature: one matrix per literal present, and the default matrix
+    # for every other value
+    by_value, wildcard_rows = {}, []
+    for row in rows:
+        (wildcard_rows if row[0] is WILDCARD else by_value.setdefault(row[0], [])).append(row[1:])
+    useful = False
+    for value_rows in by_value.values():
+        specialized = list(heapq.merge(value_rows, wildcard_rows, key=lambda row: row[-1]))
+        useful |= compute_usefulness(specialized, rest_types, reachable_rows)
+    return compute_usefulness(wildcard_rows, rest_types, reachable_rows) or useful
+
+
+def exhaustive_check(match_type: Stella.StellatypeContext, case_patterns: list) -> list[int]:
+    """Raises on non-exhaustive matches and returns indices of the cases that can never fire."""
+    reachable_rows = set()
+    if compute_usefulness([(pattern, i) for i, pattern in enumerate(case_patterns)], (match_type,), reachable_rows):
+        raise NonExhaustiveMatchError
+    return [i for i in range(len(case_patterns)) if i not in reachable_rows]
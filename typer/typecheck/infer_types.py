@@ -1,39 +1,124 @@
-from typing import Tuple
+from typing import Iterable, Tuple
 
 from typer.typecheck.type_error import *
 from typer.typecheck.type_map import TypeMap
+from typer.typecheck.checker_state import checker_state, new_checker_state
 from typer.typecheck.compare_types import compare_types, unwind_parens
-from typer.typecheck.exhaustive_check import exhaustive_check, create_case_type_getter
-
-
-def infer_types(program_context: Stella.ProgramContext):
+from typer.typecheck.subtyping import wider_type
+from typer.typecheck.exhaustive_check import exhaustive_check, check_pattern, field_types_by_label
+from typer.typecheck.unify import fresh_type_variable, is_unbound, unify, check_acyclic
+from typer.typecheck.type_scheme import generalize, instantiate
+from typer.typecheck.substitute import substitute, instantiate_forall, type_variable
+from typer.typecheck.type_format import format_type
+from typer.typecheck.type_alias import collect_type_aliases
+from typer.typecheck.recursive_types import unfold_type
+from typer.typecheck.spine import left_spine
+from typer.typecheck.type_index import TypeIndex
+from typer.limits import active_budget
+
+
+def infer_types(program_context: Stella.ProgramContext, record_types: bool = False) -> list[StellaTypeError]:
+    """Checks the program and returns its warnings. With record_types, the type of every expression checked is kept
+    in program_context.type_index, also when checking fails."""
+    extensions = {name.text for extension in program_context.extensions for name in extension.extensionNames}
+    with new_checker_state(extensions) as state:
+        if record_types:
+            state.type_records = []
+        try:
+            scope_types, fun_declarations = _declare_program(program_context)
+            for fun_decl in fun_declarations:
+                infer_expression_type(fun_decl, scope_types)
+            if state.type_reconstruction:
+                check_acyclic(state.type_variables)
+        finally:
+            if record_types:
+                program_context.type_index = TypeIndex(state.type_records)
+    # Kept with the checked program so later passes resolve its types (aliases, recursive types) the same way
+    program_context.checker_state = state
+    return state.warnings
+
+
+def infer_declaration_types(program_context: Stella.ProgramContext, declarations: Iterable[Stella.DeclContext],
+                            record_types: bool = False) \
+        -> list[tuple[Stella.DeclContext, list[StellaTypeError], StellaTypeError | None]]:
+    """Checks the bodies of the given functions, each against the signatures of the whole program, and returns every
+    declaration with its warnings and its error, if any. An error in one body does not stop the others from being
+    checked; errors of the program as a whole (a missing main, cyclic aliases) are raised. With record_types, the
+    types of each function's expressions are kept in its type_index."""
+    extensions = {name.text for extension in program_context.extensions for name in extension.extensionNames}
+    results = []
+    with new_checker_state(extensions) as state:
+        scope_types, fun_declarations = _declare_program(program_context)
+        declarations = set(declarations)
+        for fun_decl in fun_declarations:
+            if fun_decl not in declarations:
+                continue
+            first_warning = len(state.warnings)
+            if record_types:
+                state.type_records = []
+            try:
+                infer_expression_type(fun_decl, scope_types)
+                results.append((fun_decl, state.warnings[first_warning:], None))
+            except StellaTypeError as e:
+                results.append((fun_decl, state.warnings[first_warning:], e))
+            if record_types:
+                fun_decl.type_index = TypeIndex(state.type_records)
+        if state.type_reconstruction:
+            check_acyclic(state.type_variables)
+    program_context.checker_state = state
+    return results
+
+
+def _declare_program(program_context: Stella.ProgramContext) -> tuple[TypeMap, tuple]:
     program_declarations = program_context.decls
-    fun_declarations: Tuple[Stella.DeclFunContext] = tuple(
-        filter(lambda d: isinstance(d, Stella.DeclFunContext), program_declarations))
-
+    state = checker_state()
+    state.type_aliases = collect_type_aliases(program_declarations)
+    state.exception_type = _exception_type(program_context)
     scope_types = TypeMap()
-    for fun_decl in fun_declarations:
-        fun_type = Stella.TypeFunContext(fun_decl.parser, fun_decl)
-        fun_type.paramTypes = [p.paramType for p in fun_decl.paramDecls]
-        fun_type.returnType = fun_decl.returnType
-        scope_types.insert(fun_decl.StellaIdent().symbol, fun_type)
+    fun_declarations = _declare_functions(program_declarations, scope_types)
 
-    if not any(map(lambda ident: ident.text == "main", scope_types.context[0].keys())):
+    if "main" not in scope_types.context[0]:
         raise MissingMainError()
-
-    for fun_decl in fun_declarations:
-        infer_expression_type(fun_decl, scope_types)
+    return scope_types, fun_declarations
+
+
+def _exception_type(program_context: Stella.ProgramContext) -> Stella.StellatypeContext | None:
+    # Built once per program: either the declared exception type or the open variant of every exception variant
+    variant_type = None
+    for decl in program_context.decls:
+        match decl:
+            case Stella.DeclExceptionTypeContext():
+                return decl.exceptionType
+            case Stella.DeclExceptionVariantContext():
+                if variant_type is None:
+                    variant_type = Stella.TypeVariantContext(program_context.parser, Stella.StellatypeContext(
+                        program_context.parser))
+                field_type = Stella.VariantFieldTypeContext(program_context.parser, variant_type)
+                field_type.label, field_type.type_ = decl.name, decl.variantType
+                variant_type.fieldTypes.append(field_type)
+    return variant_type
 
 
 def check_inferred_type(deep_compare=False):
     def _check_impl(infer_impl):
         def infer(expression: Stella.ExprContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
-            actual_type = infer_impl(expression, scope_types, expected_type)
-            if deep_compare:
-                compare_types(expected_type, actual_type)
-            else:
-                if expected_type and not isinstance(actual_type, type(expected_type)):
-                    raise UnexpectedTypeError(type(expected_type), type(actual_type))
+            try:
+                budget = active_budget()
+                if budget is not None:
+                    budget.step()
+                actual_type = infer_impl(expression, scope_types, expected_type)
+                state = checker_state()
+                if state.type_records is not None and actual_type is not None and expression.stop is not None:
+                    state.type_records.append((expression.start.start, expression.stop.stop, actual_type))
+                if deep_compare or state.compares_every_type:
+                    compare_types(expected_type, actual_type)
+                else:
+                    if expected_type and not isinstance(actual_type, type(expected_type)):
+                        raise UnexpectedTypeError(type(expected_type), type(actual_type))
+            except StellaTypeError as e:
+                if e.span is None and expression.start is not None:
+                    e.span = Span.of(expression)
+                raise
             return actual_type
 
         return infer
@@ -42,7 +127,7 @@ def check_inferred_type(deep_compare=False):
 
 def unwind_parens_wrapper(infer_impl):
     def _infer(expression: Stella.ExprContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
-        result = infer_impl(expression, scope_types, expected_type)
+        result = infer_impl(expression, scope_types, unwind_parens(expected_type) if expected_type else None)
         return unwind_parens(result) if result else None
     return _infer
 
@@ -77,7 +162,9 @@ def infer_expression_type(expression: Stella.ExprContext,
             return _infer_if(if_ctx, scope_types, expected_type)
         # Variable
         case Stella.VarContext() as var_ctx:
-            return scope_types.find(var_ctx.name)
+            # The binding token is remembered on the reference, so later passes need no name resolution of their own
+            var_type, var_ctx.binder = scope_types.lookup(var_ctx.name)
+            return instantiate(var_type)
         # Abstraction
         case Stella.AbstractionContext() as abs_ctx:
             return _infer_abstraction(abs_ctx, scope_types, expected_type)
@@ -131,17 +218,89 @@ def infer_expression_type(expression: Stella.ExprContext,
         # Fix-point
         case Stella.FixContext() as fix_ctx:
             return _infer_fix(fix_ctx, scope_types, expected_type)
+        # Universal types
+        case Stella.TypeAbstractionContext() as type_abs_ctx:
+            return _infer_type_abstraction(type_abs_ctx, scope_types, expected_type)
+        case Stella.TypeApplicationContext() as type_app_ctx:
+            return _infer_type_application(type_app_ctx, scope_types, expected_type)
+        # References
+        case Stella.RefContext() as ref_ctx:
+            return _infer_ref(ref_ctx, scope_types, expected_type)
+        case Stella.DerefContext() as deref_ctx:
+            return _infer_deref(deref_ctx, scope_types, expected_type)
+        case Stella.AssignContext() as assign_ctx:
+            return _infer_assign(assign_ctx, scope_types, expected_type)
+        case Stella.ConstMemoryContext() as memory_ctx:
+            return _infer_memory_address(memory_ctx, scope_types, expected_type)
+        # Sequencing and recursive let
+        case Stella.SequenceContext() as sequence_ctx:
+            return _infer_sequence(sequence_ctx, scope_types, expected_type)
+        case Stella.LetRecContext() as letrec_ctx:
+            return _infer_letrec(letrec_ctx, scope_types, expected_type)
+        # Operators
+        case Stella.AddContext() | Stella.SubtractContext() | Stella.MultiplyContext() | Stella.DivideContext() \
+                as arithmetic_ctx:
+            return _infer_operator_chain(arithmetic_ctx, scope_types, _ARITHMETIC_OPERATORS, Stella.TypeNatContext)
+        case Stella.LogicAndContext() | Stella.LogicOrContext() as logic_ctx:
+            return _infer_operator_chain(logic_ctx, scope_types, _LOGIC_OPERATORS, Stella.TypeBoolContext)
+        case Stella.LogicNotContext() as not_ctx:
+            infer_expression_type(not_ctx.expr_, scope_types, Stella.TypeBoolContext(not_ctx.parser, not_ctx))
+            return Stella.TypeBoolContext(not_ctx.parser, not_ctx)
+        case Stella.LessThanContext() | Stella.LessThanOrEqualContext() | Stella.GreaterThanContext() \
+                | Stella.GreaterThanOrEqualContext() | Stella.EqualContext() | Stella.NotEqualContext() as comparison_ctx:
+            return _infer_comparison(comparison_ctx, scope_types)
+        # Exceptions
+        case Stella.PanicContext() as panic_ctx:
+            return _infer_panic(panic_ctx, scope_types, expected_type)
+        case Stella.ThrowContext() as throw_ctx:
+            return _infer_throw(throw_ctx, scope_types, expected_type)
+        case Stella.TryWithContext() as try_with_ctx:
+            return _infer_try_with(try_with_ctx, scope_types, expected_type)
+        case Stella.TryCatchContext() as try_catch_ctx:
+            return _infer_try_catch(try_catch_ctx, scope_types, expected_type)
+        # Recursive types
+        case Stella.FoldContext() as fold_ctx:
+            return _infer_fold(fold_ctx, scope_types, expected_type)
+        case Stella.UnfoldContext() as unfold_ctx:
+            return _infer_unfold(unfold_ctx, scope_types, expected_type)
         # Function declaration
-        case Stella.DeclFunContext() as fun_ctx:
-            expected_return_type = scope_types.find(fun_ctx.StellaIdent().symbol).returnType
+        case Stella.DeclFunContext() | Stella.DeclFunGenericContext() as fun_ctx:
+            fun_type = unwind_parens(scope_types.find(fun_ctx.name))
+            if isinstance(fun_type, Stella.TypeForAllContext):
+                fun_type = fun_type.type_
             function_scope = scope_types.nested_scope()
             for param_decl in fun_ctx.paramDecls:
                 function_scope.insert(param_decl.name, param_decl.paramType)
-            infer_expression_type(fun_ctx.returnExpr, function_scope, expected_type=expected_return_type)
+            for local_decl in _declare_functions(fun_ctx.localDecls, function_scope):
+                infer_expression_type(local_decl, function_scope)
+            infer_expression_type(fun_ctx.returnExpr, function_scope, expected_type=fun_type.returnType)
         case _ as unexpected:
-            print(unexpected.start)
-            print(type(unexpected))
-            raise NotImplementedError
+            raise UnsupportedExpressionError(unexpected)
+
+
+def _declare_functions(declarations: list[Stella.DeclContext],
+                       scope_types: TypeMap) -> Tuple[Stella.DeclFunContext | Stella.DeclFunGenericContext]:
+    # Every sibling is declared before any body is checked, so siblings may call each other
+    fun_declarations = tuple(
+        filter(lambda d: isinstance(d, (Stella.DeclFunContext, Stella.DeclFunGenericContext)), declarations))
+    for fun_decl in fun_declarations:
+        scope_types.insert(fun_decl.name, _fun_decl_type(fun_decl))
+    return fun_declarations
+
+
+def _fun_decl_type(fun_decl: Stella.DeclFunContext | Stella.DeclFunGenericContext):
+    fun_type = Stella.TypeFunContext(fun_decl.parser, fun_decl)
+    fun_type.paramTypes = [p.paramType for p in fun_decl.paramDecls]
+    fun_type.returnType = fun_decl.returnType
+    if not fun_type.returnType and checker_state().type_reconstruction:
+        fun_type.returnType = fresh_type_variable()
+    if isinstance(fun_decl, Stella.DeclFunContext):
+        return fun_type
+
+    generic_fun_type = Stella.TypeForAllContext(fun_decl.parser, fun_decl)
+    generic_fun_type.types = fun_decl.generics
+    generic_fun_type.type_ = fun_type
+    return generic_fun_type
 
 
 @check_inferred_type()
@@ -162,7 +321,14 @@ def _infer_if(expression: Stella.IfContext, scope_types: TypeMap, expected_type:
                                       Stella.TypeBoolContext(expression.parser, expression))
     then_type = infer_expression_type(expression.thenExpr, scope_types, expected_type)
     else_type = infer_expression_type(expression.elseExpr, scope_types, expected_type)
-    if not isinstance(then_type, type(else_type)):
+    state = checker_state()
+    if state.type_reconstruction:
+        unify(then_type, else_type)
+    elif state.structural_subtyping:
+        # With an expected type each branch has already been checked against it on its own
+        if expected_type is None:
+            return wider_type(then_type, else_type)
+    elif not isinstance(then_type, type(else_type)):
         raise UnexpectedTypeError(type(then_type), type(else_type))
     return then_type
 
@@ -188,7 +354,7 @@ def _infer_nat_rec(expression: Stella.NatRecContext, scope_types: TypeMap, expec
     step_fun_type.returnType.type_.returnType = initial_type
 
     infer_expression_type(expression.step, scope_types, step_fun_type)
-    return expected_type
+    return initial_type
 
 
 @check_inferred_type(deep_compare=True)
@@ -198,6 +364,9 @@ def _infer_application(expression: Stella.ApplicationContext, scope_types: TypeM
     expected_lhs_fun_type.returnType = expected_type
 
     fun_type = infer_expression_type(expression.fun, scope_types)
+    if is_unbound(fun_type):
+        fun_type = _refine_unbound(fun_type, _fun_type(expression, [fresh_type_variable() for _ in expression.args],
+                                                       fresh_type_variable()))
     if not isinstance(fun_type, Stella.TypeFunContext):
         raise NotFunctionError(type(fun_type))
 
@@ -217,6 +386,8 @@ def _infer_application(expression: Stella.ApplicationContext, scope_types: TypeM
 def _infer_abstraction(expression: Stella.AbstractionContext, scope_types: TypeMap,
                        expected_type: Stella.StellatypeContext = None):
     expected_type = unwind_parens(expected_type) if expected_type else None
+    if is_unbound(expected_type):
+        expected_type = None
 
     if expected_type and not isinstance(expected_type, Stella.TypeFunContext):
         raise UnexpectedLambdaError(type(expected_type))
@@ -238,17 +409,24 @@ def _infer_abstraction(expression: Stella.AbstractionContext, scope_types: TypeM
 
 @check_inferred_type()
 def _infer_let(expression: Stella.LetContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    state = checker_state()
     let_scope = scope_types.nested_scope()
     pattern_binding: Stella.PatternBindingContext
     for pattern_binding in expression.patternBindings:
         binding_token = pattern_binding.pat.StellaIdent().symbol
-        binding_type = infer_expression_type(pattern_binding.rhs, scope_types)
-        let_scope.insert(binding_token, binding_type)
+        if state.let_polymorphism:
+            with state.deeper_level():
+                binding_type = infer_expression_type(pattern_binding.rhs, scope_types)
+            let_scope.insert(binding_token, generalize(binding_type))
+        else:
+            binding_type = infer_expression_type(pattern_binding.rhs, scope_types)
+            let_scope.insert(binding_token, binding_type)
     return infer_expression_type(expression.body, let_scope, expected_type)
 
 
 @check_inferred_type()
 def _infer_list(expression: Stella.ListContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    expected_type = _reconstructed_list_type(expression, expected_type)
     if not expected_type or (isinstance(expected_type, Stella.TypeListContext) and not expected_type.type_):
         raise AmbiguousListTypeError
     if not isinstance(expected_type, Stella.TypeListContext):
@@ -261,6 +439,7 @@ def _infer_list(expression: Stella.ListContext, scope_types: TypeMap, expected_t
 @check_inferred_type()
 def _infer_cons_list(expression: Stella.ConsListContext, scope_types: TypeMap,
                      expected_type: Stella.StellatypeContext = None):
+    expected_type = _reconstructed_list_type(expression, expected_type)
     if not expected_type:
         raise AmbiguousListTypeError
     if not isinstance(expected_type, Stella.TypeListContext):
@@ -273,26 +452,27 @@ def _infer_cons_list(expression: Stella.ConsListContext, scope_types: TypeMap,
 
 @check_inferred_type()
 def _infer_list_head(expression: Stella.HeadContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
-    expected_list_type = Stella.TypeListContext(expression.parser, expression)
-    expected_list_type.type_ = expected_type
-    list_type = infer_expression_type(expression.list_, scope_types)
+    list_type = _refine_unbound(infer_expression_type(expression.list_, scope_types),
+                                _list_type(expression, fresh_type_variable()))
     if not isinstance(list_type, Stella.TypeListContext):
         raise NotListError(type(list_type))
-    return expected_type
+    return list_type.type_
 
 
 @check_inferred_type()
 def _infer_list_tail(expression: Stella.TailContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
-    list_type = infer_expression_type(expression.list_, scope_types)
+    list_type = _refine_unbound(infer_expression_type(expression.list_, scope_types),
+                                _list_type(expression, fresh_type_variable()))
     if not isinstance(list_type, Stella.TypeListContext):
         raise NotListError(type(list_type))
-    return expected_type
+    return list_type
 
 
 @check_inferred_type()
 def _infer_is_empty(expression: Stella.IsEmptyContext, scope_types: TypeMap,
                     expected_type: Stella.StellatypeContext = None):
-    list_type = infer_expression_type(expression.list_, scope_types)
+    list_type = _refine_unbound(infer_expression_type(expression.list_, scope_types),
+                                _list_type(expression, fresh_type_variable()))
     if not isinstance(list_type, Stella.TypeListContext):
         raise NotListError(type(list_type))
     return Stella.TypeBoolContext(expression.parser, expression)
@@ -317,15 +497,10 @@ def _infer_dot_record(expression: Stella.DotRecordContext, scope_types: TypeMap,
     record_type = infer_expression_type(expression.expr_, scope_types)
     if not isinstance(record_type, Stella.TypeRecordContext):
         raise NotRecordError
-    record_type_map = TypeMap()
-    for field_type in record_type.fieldTypes:
-        record_type_map.insert(field_type.label, field_type.type_)
-
-    try:
-        label_type = record_type_map.find(expression.label)
-    except UndefinedVarError as e:
-        raise UnexpectedFieldAccessError from e
-    return label_type
+    field_types = field_types_by_label(record_type)
+    if expression.label.text not in field_types:
+        raise UnexpectedFieldAccessError
+    return field_types[expression.label.text]
 
 
 @check_inferred_type()
@@ -342,8 +517,9 @@ def _infer_tuple(expression: Stella.TupleContext, scope_types: TypeMap, expected
 @check_inferred_type(deep_compare=True)
 def _infer_dot_tuple(expression: Stella.DotTupleContext, scope_types: TypeMap,
                      expected_type: Stella.StellatypeContext = None):
-    tuple_type = infer_expression_type(expression.expr_, scope_types,
-                                       expected_type=expected_type)
+    tuple_type = infer_expression_type(expression.expr_, scope_types)
+    if not isinstance(tuple_type, Stella.TypeTupleContext):
+        raise NotTupleError(type(tuple_type))
 
     int_idx = int(expression.index.text)
     if int_idx < 1 or int_idx > len(tuple_type.types):
@@ -360,6 +536,7 @@ def _infer_ascription(expression: Stella.TypeAscContext, scope_types: TypeMap, e
 
 @check_inferred_type()
 def _infer_inl(expression: Stella.InlContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    expected_type = _reconstructed_sum_type(expression, expected_type)
     if not expected_type:
         raise AmbiguousSumTypeError
     if not isinstance(expected_type, Stella.TypeSumContext):
@@ -371,6 +548,7 @@ def _infer_inl(expression: Stella.InlContext, scope_types: TypeMap, expected_typ
 
 @check_inferred_type()
 def _infer_inr(expression: Stella.InlContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    expected_type = _reconstructed_sum_type(expression, expected_type)
     if not expected_type:
         raise AmbiguousSumTypeError
     if not isinstance(expected_type, Stella.TypeSumContext):
@@ -387,14 +565,16 @@ def _infer_variant(expression: Stella.VariantContext, scope_types: TypeMap, expe
     if not isinstance(expected_type, Stella.TypeVariantContext):
         raise UnexpectedVariantError(expected_type)
 
-    variant_field_types = TypeMap()
-    for var_field_type in expected_type.fieldTypes:
-        variant_field_types.insert(var_field_type.label, var_field_type)
-
-    try:
-        variant_type = variant_field_types.find(expression.label)
-    except UndefinedVarError:
+    field_types = field_types_by_label(expected_type)
+    if expression.label.text not in field_types:
         raise UnexpectedVariantLabelError(expression.label)
+    field_type = field_types[expression.label.text]
+    if expression.rhs is not None and field_type is None:
+        raise UnexpectedDataForNullaryLabelError(expression.label.text)
+    if expression.rhs is None and field_type is not None:
+        raise MissingDataForLabelError(expression.label.text)
+    if expression.rhs is not None:
+        infer_expression_type(expression.rhs, scope_types, field_type)
     return expected_type
 
 
@@ -405,16 +585,25 @@ def _infer_match(expression: Stella.MatchContext, scope_types: TypeMap, expected
     if len(expression.cases) == 0:
         raise IllegalEmptyMatchError
 
-    case_to_type_map = exhaustive_check(expr_type, expression.cases)
-    type_getter = create_case_type_getter(expr_type, case_to_type_map)
-
+    case_scopes = []
+    case_patterns = []
     match_case: Stella.MatchCaseContext
     for match_case in expression.cases:
-        case_type = type_getter(match_case.pattern_)
-        pattern_var: Stella.PatternVarContext = match_case.pattern_.pattern_
         case_scope_types = scope_types.nested_scope()
-        case_scope_types.insert(pattern_var.name, case_type)
-        infer_expression_type(match_case.expr_, case_scope_types, expected_type)
+        case_patterns.append(check_pattern(match_case.pattern_, expr_type, case_scope_types))
+        case_scopes.append(case_scope_types)
+
+    expression.scrutinee_type = expr_type
+    expression.case_patterns = case_patterns
+    for case_index in exhaustive_check(expr_type, case_patterns):
+        unreachable_pattern = expression.cases[case_index].pattern_
+        warning = UnreachablePatternError(unreachable_pattern.getText())
+        warning.span = Span.of(unreachable_pattern)
+        checker_state().warnings.append(warning)
+
+    for match_case, case_scope_types in zip(expression.cases, case_scopes):
+        case_type = infer_expression_type(match_case.expr_, case_scope_types, expected_type)
+        expected_type = expected_type or case_type
 
     return expected_type
 
@@ -422,6 +611,254 @@ def _infer_match(expression: Stella.MatchContext, scope_types: TypeMap, expected
 @check_inferred_type()
 def _infer_fix(expression: Stella.FixContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
     inner_expr_type = infer_expression_type(expression.expr_, scope_types)
+    if is_unbound(inner_expr_type):
+        fixed_point_type = fresh_type_variable()
+        inner_expr_type = _refine_unbound(inner_expr_type, _fun_type(expression, [fixed_point_type], fixed_point_type))
     if not isinstance(inner_expr_type, Stella.TypeFunContext):
         raise NotFunctionError(type(inner_expr_type))
+    # The evaluator unrolls fixed points of functions lazily and all others at once
+    expression.fixed_point_type = inner_expr_type.returnType
     return inner_expr_type.returnType
+
+
+def _fun_type(expression: Stella.ExprContext, param_types: list, return_type: Stella.StellatypeContext):
+    fun_type = Stella.TypeFunContext(expression.parser, expression)
+    fun_type.paramTypes = param_types
+    fun_type.returnType = return_type
+    return fun_type
+
+
+def _list_type(expression: Stella.ExprContext, element_type: Stella.StellatypeContext):
+    list_type = Stella.TypeListContext(expression.parser, expression)
+    list_type.type_ = element_type
+    return list_type
+
+
+def _refine_unbound(inferred_type: Stella.StellatypeContext, shape: Stella.StellatypeContext):
+    # An unsolved type variable takes the shape the expression requires; solved types are left untouched
+    if not is_unbound(inferred_type):
+        return inferred_type
+    unify(inferred_type, shape)
+    return shape
+
+
+def _reconstructed_list_type(expression: Stella.ExprContext, expected_type: Stella.StellatypeContext):
+    if not checker_state().type_reconstruction:
+        return expected_type
+    if not expected_type or is_unbound(expected_type):
+        return _refine_unbound(expected_type or fresh_type_variable(), _list_type(expression, fresh_type_variable()))
+    return expected_type
+
+
+def _reconstructed_sum_type(expression: Stella.ExprContext, expected_type: Stella.StellatypeContext):
+    if not checker_state().type_reconstruction:
+        return expected_type
+    if not expected_type or is_unbound(expected_type):
+        sum_type = Stella.TypeSumContext(expression.parser, expression)
+        sum_type.left, sum_type.right = fresh_type_variable(), fresh_type_variable()
+        return _refine_unbound(expected_type or fresh_type_variable(), sum_type)
+    return expected_type
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_type_abstraction(expression: Stella.TypeAbstractionContext, scope_types: TypeMap,
+                            expected_type: Stella.StellatypeContext = None):
+    expected_body_type = None
+    if isinstance(expected_type, Stella.TypeForAllContext) and len(expected_type.types) == len(expression.generics):
+        expected_body_type = substitute(expected_type.type_, {
+            expected_name.text: type_variable(name.text, expression.parser)
+            for expected_name, name in zip(expected_type.types, expression.generics)
+        })
+
+    generic_type = Stella.TypeForAllContext(expression.parser, expression)
+    generic_type.types = expression.generics
+    generic_type.type_ = infer_expression_type(expression.expr_, scope_types, expected_body_type)
+    return generic_type
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_type_application(expression: Stella.TypeApplicationContext, scope_types: TypeMap,
+                            expected_type: Stella.StellatypeContext = None):
+    generic_type = infer_expression_type(expression.fun, scope_types)
+    if not isinstance(generic_type, Stella.TypeForAllContext):
+        raise NotGenericFunctionError(format_type(generic_type))
+    if len(generic_type.types) != len(expression.types):
+        raise IncorrectNumberOfTypeArgumentsError(len(generic_type.types), len(expression.types))
+    return instantiate_forall(generic_type, expression.types)
+
+
+def _recursive_type(annotation: Stella.StellatypeContext) -> Stella.TypeRecContext | None:
+    # With equi-recursive types µX.T and its unfolding are the same type, so fold and unfold are identities
+    rec_type = unwind_parens(annotation)
+    if isinstance(rec_type, Stella.TypeRecContext):
+        return rec_type
+    if checker_state().equirecursive_types:
+        return None
+    raise NotRecursiveTypeError(format_type(annotation))
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_fold(expression: Stella.FoldContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    rec_type = _recursive_type(expression.type_)
+    if rec_type is None:
+        return infer_expression_type(expression.expr_, scope_types, expression.type_)
+    infer_expression_type(expression.expr_, scope_types, unfold_type(rec_type))
+    return rec_type
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_unfold(expression: Stella.UnfoldContext, scope_types: TypeMap,
+                  expected_type: Stella.StellatypeContext = None):
+    rec_type = _recursive_type(expression.type_)
+    if rec_type is None:
+        return infer_expression_type(expression.expr_, scope_types, expression.type_)
+    infer_expression_type(expression.expr_, scope_types, rec_type)
+    return unfold_type(rec_type)
+
+
+def _ref_type(expression: Stella.ExprContext, content_type: Stella.StellatypeContext):
+    ref_type = Stella.TypeRefContext(expression.parser, expression)
+    ref_type.type_ = content_type
+    return ref_type
+
+
+def _reference_to(expression: Stella.ExprContext, scope_types: TypeMap) -> Stella.TypeRefContext:
+    ref_type = _refine_unbound(infer_expression_type(expression, scope_types),
+                               _ref_type(expression, fresh_type_variable()))
+    if not isinstance(ref_type, Stella.TypeRefContext):
+        raise NotReferenceError(format_type(ref_type))
+    return ref_type
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_ref(expression: Stella.RefContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    if isinstance(expected_type, Stella.TypeRefContext):
+        infer_expression_type(expression.expr_, scope_types, expected_type.type_)
+        return expected_type
+    # Under subtyping a reference may still be expected as a supertype such as Top
+    if expected_type and not is_unbound(expected_type) and not checker_state().structural_subtyping:
+        raise UnexpectedReferenceError(format_type(expected_type))
+    return _ref_type(expression, infer_expression_type(expression.expr_, scope_types))
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_deref(expression: Stella.DerefContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    return _reference_to(expression.expr_, scope_types).type_
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_assign(expression: Stella.AssignContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    ref_type = _reference_to(expression.lhs, scope_types)
+    infer_expression_type(expression.rhs, scope_types, ref_type.type_)
+    return Stella.TypeUnitContext(expression.parser, expression)
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_memory_address(expression: Stella.ConstMemoryContext, scope_types: TypeMap,
+                          expected_type: Stella.StellatypeContext = None):
+    if not expected_type or is_unbound(expected_type):
+        raise AmbiguousReferenceTypeError
+    if not isinstance(expected_type, Stella.TypeRefContext):
+        raise UnexpectedMemoryAddressError(format_type(expected_type))
+    return expected_type
+
+
+def _exception_result_type(expected_type: Stella.StellatypeContext, ambiguous_error: type[StellaTypeError]):
+    # panic! and throw never return, so they take whatever type the context expects
+    if expected_type:
+        return expected_type
+    if checker_state().type_reconstruction:
+        return fresh_type_variable()
+    raise ambiguous_error
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_panic(expression: Stella.PanicContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    return _exception_result_type(expected_type, AmbiguousPanicTypeError)
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_throw(expression: Stella.ThrowContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    exception_type = checker_state().exception_type
+    if exception_type is None:
+        raise ExceptionTypeNotDeclaredError
+    infer_expression_type(expression.expr_, scope_types, exception_type)
+    return _exception_result_type(expected_type, AmbiguousThrowTypeError)
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_try_with(expression: Stella.TryWithContext, scope_types: TypeMap,
+                    expected_type: Stella.StellatypeContext = None):
+    try_type = infer_expression_type(expression.tryExpr, scope_types, expected_type)
+    infer_expression_type(expression.fallbackExpr, scope_types, expected_type or try_type)
+    return expected_type or try_type
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_try_catch(expression: Stella.TryCatchContext, scope_types: TypeMap,
+                     expected_type: Stella.StellatypeContext = None):
+    exception_type = checker_state().exception_type
+    if exception_type is None:
+        raise ExceptionTypeNotDeclaredError
+    try_type = infer_expression_type(expression.tryExpr, scope_types, expected_type)
+    catch_scope = scope_types.nested_scope()
+    check_pattern(expression.pat, exception_type, catch_scope)
+    infer_expression_type(expression.fallbackExpr, catch_scope, expected_type or try_type)
+    return expected_type or try_type
+
+
+_ARITHMETIC_OPERATORS = (Stella.AddContext, Stella.SubtractContext, Stella.MultiplyContext, Stella.DivideContext)
+_LOGIC_OPERATORS = (Stella.LogicAndContext, Stella.LogicOrContext)
+_EQUALITY_OPERATORS = (Stella.EqualContext, Stella.NotEqualContext)
+
+
+def _infer_operator_chain(expression: Stella.ExprContext, scope_types: TypeMap, operator_types: tuple,
+                          operand_type: type[Stella.StellatypeContext]):
+    leftmost, operators = left_spine(expression, operator_types)
+    for operand in [leftmost, *(operator.right for operator in operators)]:
+        infer_expression_type(operand, scope_types, operand_type(expression.parser, expression))
+    return operand_type(expression.parser, expression)
+
+
+def _infer_comparison(expression: Stella.ExprContext, scope_types: TypeMap):
+    if isinstance(expression, _EQUALITY_OPERATORS):
+        left_type = infer_expression_type(expression.left, scope_types)
+        infer_expression_type(expression.right, scope_types, left_type)
+    else:
+        for operand in (expression.left, expression.right):
+            infer_expression_type(operand, scope_types, Stella.TypeNatContext(expression.parser, expression))
+    return Stella.TypeBoolContext(expression.parser, expression)
+
+
+def _infer_sequence(expression: Stella.SequenceContext, scope_types: TypeMap,
+                    expected_type: Stella.StellatypeContext = None):
+    first, sequences = left_spine(expression, Stella.SequenceContext, lambda e: e.expr1)
+    *effects, result = [first, *(sequence.expr2 for sequence in sequences)]
+    for effect in effects:
+        infer_expression_type(effect, scope_types, Stella.TypeUnitContext(expression.parser, expression))
+    return infer_expression_type(result, scope_types, expected_type)
+
+
+@check_inferred_type(deep_compare=True)
+def _infer_letrec(expression: Stella.LetRecContext, scope_types: TypeMap, expected_type: Stella.StellatypeContext = None):
+    # All bindings are in scope in every right-hand side, so each needs its type before any of them is checked
+    letrec_scope = scope_types.nested_scope()
+    binding_types = []
+    for pattern_binding in expression.patternBindings:
+        binding_type = _letrec_binding_type(pattern_binding)
+        check_pattern(pattern_binding.pat, binding_type, letrec_scope)
+        binding_types.append(binding_type)
+    for pattern_binding, binding_type in zip(expression.patternBindings, binding_types):
+        infer_expression_type(pattern_binding.rhs, letrec_scope, binding_type)
+    return infer_expression_type(expression.body, letrec_scope, expected_type)
+
+
+def _letrec_binding_type(pattern_binding: Stella.PatternBindingContext) -> Stella.StellatypeContext:
+    rhs = pattern_binding.rhs
+    while isinstance(rhs, Stella.ParenthesisedExprContext):
+        rhs = rhs.expr_
+    if isinstance(rhs, Stella.TypeAscContext):
+        return rhs.type_
+    if checker_state().type_reconstruction:
+        return fresh_type_variable()
+    raise AmbiguousPatternTypeError(pattern_binding.pat.getText())
@@ -0,0 +1,48 @@
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import checker_state
+from typer.typecheck.substitute import substitute
+from typer.typecheck.type_error import type_mismatch_error
+from typer.typecheck.unify import resolve, type_argument_pairs
+
+
+def unfold_type(rec_type: Stella.TypeRecContext) -> Stella.StellatypeContext:
+    """Body of µX.T with X replaced by the recursive type itself. The unfolding is computed once per µ-binder and
+    refers back to the binder, so repeated unfolding walks a finite graph instead of growing the type."""
+    try:
+        return rec_type.unfolding
+    except AttributeError:
+        rec_type.unfolding = substitute(rec_type.type_, {rec_type.var.text: rec_type})
+        return rec_type.unfolding
+
+
+def head_type(stella_type: Stella.StellatypeContext) -> Stella.StellatypeContext:
+    """Resolves a type and, with equi-recursive types, unfolds µ-binders until its outermost constructor is known."""
+    stella_type = resolve(stella_type)
+    if not isinstance(stella_type, Stella.TypeRecContext) or not checker_state().equirecursive_types:
+        return stella_type
+    unfolded = set()
+    while isinstance(stella_type, Stella.TypeRecContext) and id(stella_type) not in unfolded:
+        # Non-contractive types such as µX.X have no head constructor and are left folded
+        unfolded.add(id(stella_type))
+        stella_type = resolve(unfold_type(stella_type))
+    return stella_type
+
+
+def check_type_equivalence(expected: Stella.StellatypeContext, actual: Stella.StellatypeContext):
+    """Equi-recursive type equality. Pairs under comparison are assumed equal, so comparing infinite unfoldings
+    terminates after visiting each pair of type nodes once; pairs proven equal are remembered for the whole program."""
+    proven = checker_state().equivalent_types
+    pending = [(expected, actual)]
+    assumed = {}
+    while pending:
+        expected, actual = pending.pop()
+        expected, actual = head_type(expected), head_type(actual)
+        key = (id(expected), id(actual))
+        if expected is actual or key in assumed or key in proven:
+            continue
+        # The nodes are kept alive alongside their ids so the ids are never reused
+        assumed[key] = (expected, actual)
+        if type(expected) is not type(actual):
+            raise type_mismatch_error(expected, actual)
+        pending.extend(type_argument_pairs(expected, actual))
+    proven.update(assumed)
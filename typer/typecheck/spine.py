@@ -0,0 +1,16 @@
+from typer.grammar.stellaParser import stellaParser as Stella
+
+
+def left_spine(expression: Stella.ExprContext, operator_types: type | tuple,
+               left=lambda e: e.left) -> tuple[Stella.ExprContext, list[Stella.ExprContext]]:
+    """Leftmost operand of a left-associative chain and the chain's operator nodes, innermost first.
+
+    Such chains parse into left spines as deep as the chain is long; walking them in a loop keeps the recursion depth
+    of a pass over the tree independent of the chain length.
+    """
+    operators = []
+    while isinstance(expression, operator_types):
+        operators.append(expression)
+        expression = left(expression)
+    operators.reverse()
+    return expression, operators
@@ -0,0 +1,146 @@
+import itertools
+
+from antlr4.Token import CommonToken
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.type_transform import map_type
+from typer.typecheck.type_alias import enclosing_binder
+from typer.typecheck.unify import TypeVariableContext, resolve, type_children
+
+_fresh_names = itertools.count()
+
+
+def type_variable(name: str, parser=None) -> Stella.TypeVarContext:
+    type_var = Stella.TypeVarContext(parser, Stella.StellatypeContext(parser))
+    type_var.name = _identifier(name)
+    return type_var
+
+
+def _identifier(name: str) -> CommonToken:
+    token = CommonToken(type=Stella.StellaIdent)
+    token.text = name
+    return token
+
+
+def binder_names(binder_type: Stella.TypeForAllContext | Stella.TypeRecContext) -> list[str]:
+    if isinstance(binder_type, Stella.TypeForAllContext):
+        return [token.text for token in binder_type.types]
+    return [binder_type.var.text]
+
+
+def free_type_variables(stella_type: Stella.StellatypeContext) -> set[str]:
+    stella_type = resolve(stella_type)
+    match stella_type:
+        case Stella.TypeVarContext():
+            return {stella_type.name.text}
+        case Stella.TypeForAllContext() | Stella.TypeRecContext():
+            return free_type_variables(stella_type.type_) - set(binder_names(stella_type))
+        case _:
+            return set().union(*(free_type_variables(child) for child in type_children(stella_type)))
+
+
+def substitute(stella_type: Stella.StellatypeContext, mapping: dict[str, Stella.StellatypeContext]):
+    """Capture-avoiding substitution of type variables by name."""
+    if not mapping:
+        return stella_type
+
+    def transform(node):
+        match node:
+            case Stella.TypeVarContext():
+                return mapping.get(node.name.text)
+            case Stella.TypeForAllContext() | Stella.TypeRecContext():
+                return _substitute_under_binder(node, mapping)
+        return None
+
+    return map_type(stella_type, transform)
+
+
+def _substitute_under_binder(binder_type: Stella.TypeForAllContext | Stella.TypeRecContext, mapping: dict):
+    names = binder_names(binder_type)
+    inner_mapping = {name: replacement for name, replacement in mapping.items() if name not in names}
+    if not inner_mapping:
+        return binder_type
+
+    captured = set().union(*(free_type_variables(replacement) for replacement in inner_mapping.values()))
+    renamed = []
+    for name in names:
+        if name in captured:
+            fresh_name = f"{name}'{next(_fresh_names)}"
+            inner_mapping[name] = type_variable(fresh_name, binder_type.parser)
+            renamed.append(fresh_name)
+        else:
+            renamed.append(name)
+
+    inner_type = substitute(binder_type.type_, inner_mapping)
+    if inner_type is binder_type.type_ and renamed == names:
+        return binder_type
+    result = type(binder_type)(binder_type.parser, binder_type)
+    result.type_ = inner_type
+    if isinstance(binder_type, Stella.TypeForAllContext):
+        result.types = [_identifier(name) for name in renamed]
+    else:
+        result.var = _identifier(renamed[0])
+    return result
+
+
+def instantiate_forall(forall_type: Stella.TypeForAllContext, type_arguments: list[Stella.StellatypeContext]):
+    """Body of a universal type with its variables replaced by the type arguments. Instantiations are memoized on the
+    universal type by the structure of the arguments, so every application at the same types shares one signature."""
+    key = tuple(_type_key(argument) for argument in type_arguments)
+    if None in key:
+        return substitute(forall_type.type_, _instantiation_mapping(forall_type, type_arguments))
+    try:
+        instantiations = forall_type.instantiations
+    except AttributeError:
+        instantiations = forall_type.instantiations = {}
+    if key not in instantiations:
+        instantiations[key] = substitute(forall_type.type_, _instantiation_mapping(forall_type, type_arguments))
+    return instantiations[key]
+
+
+def _instantiation_mapping(forall_type: Stella.TypeForAllContext, type_arguments: list) -> dict:
+    return {token.text: argument for token, argument in zip(forall_type.types, type_arguments)}
+
+
+def _type_key(stella_type: Stella.StellatypeContext):
+    # Types written in the source never change, so their key is computed once per node
+    if stella_type.start is None:
+        return _structure_key(stella_type)
+    try:
+        return stella_type.type_key
+    except AttributeError:
+        key = _structure_key(stella_type)
+        if key is not None:
+            stella_type.type_key = key
+        return key
+
+
+def _structure_key(stella_type: Stella.StellatypeContext):
+    """The type with aliases expanded and every type variable told apart by its binder, so that an alias and a type
+    parameter of the same name get different keys. None for a type holding a variable of type reconstruction, whose
+    solution may still change."""
+    stella_type = resolve(stella_type)
+    match stella_type:
+        case TypeVariableContext():
+            return None
+        case Stella.TypeVarContext():
+            binder = enclosing_binder(stella_type)
+            return "var", stella_type.name.text, id(binder) if binder is not None else None
+        case Stella.TypeForAllContext() | Stella.TypeRecContext():
+            body = _structure_key(stella_type.type_)
+            return None if body is None else (type(stella_type).__name__, id(stella_type), body)
+        case Stella.TypeRecordContext() | Stella.TypeVariantContext():
+            fields = []
+            for field in stella_type.fieldTypes:
+                field_key = _structure_key(field.type_) if field.type_ is not None else ()
+                if field_key is None:
+                    return None
+                fields.append((field.label.text, field_key))
+            return type(stella_type).__name__, tuple(fields)
+    children = []
+    for child in type_children(stella_type):
+        child_key = _structure_key(child)
+        if child_key is None:
+            return None
+        children.append(child_key)
+    return type(stella_type).__name__, tuple(children)
@@ -0,0 +1,102 @@
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import checker_state
+from typer.typecheck.exhaustive_check import field_types_by_label
+from typer.typecheck.substitute import substitute, type_variable
+from typer.typecheck.type_error import (type_mismatch_error, StellaTypeError, MissingRecordFieldsError,
+                                       UnexpectedSubtypeError, UnexpectedTupleLengthError, UnexpectedVariantLabelError)
+from typer.typecheck.type_format import format_type
+from typer.typecheck.recursive_types import head_type
+
+
+def check_subtype(subtype: Stella.StellatypeContext, supertype: Stella.StellatypeContext):
+    """Raises unless subtype <: supertype. Successful checks are cached by the identity of the pair of type nodes,
+    so a check repeated at a hot call site is a single dictionary lookup. A pair is entered before its components are
+    checked, which makes the check coinductive and lets it terminate on equi-recursive types."""
+    subtype, supertype = head_type(subtype), head_type(supertype)
+    if subtype is supertype:
+        return
+    cache = checker_state().subtype_cache
+    key = (id(subtype), id(supertype))
+    if key in cache:
+        return
+    # The nodes are kept alive by the cache entry so their ids are never reused
+    cache[key] = (subtype, supertype)
+    try:
+        _check_subtype(subtype, supertype)
+    except StellaTypeError:
+        del cache[key]
+        raise
+
+
+def wider_type(left: Stella.StellatypeContext, right: Stella.StellatypeContext) -> Stella.StellatypeContext:
+    """Whichever of two types the other is a subtype of, so that neither order of the two is preferred. Raises the
+    error of right <: left when the types are unrelated."""
+    try:
+        check_subtype(right, left)
+        return left
+    except StellaTypeError as error:
+        try:
+            check_subtype(left, right)
+        except StellaTypeError:
+            raise error from None
+        return right
+
+
+def _check_subtype(subtype: Stella.StellatypeContext, supertype: Stella.StellatypeContext):
+    if isinstance(supertype, Stella.TypeTopContext) or isinstance(subtype, Stella.TypeBottomContext):
+        return
+    if type(subtype) is not type(supertype):
+        raise type_mismatch_error(supertype, subtype)
+
+    match supertype:
+        case Stella.TypeFunContext():
+            if len(supertype.paramTypes) != len(subtype.paramTypes):
+                raise UnexpectedSubtypeError(format_type(supertype), format_type(subtype))
+            for super_param, sub_param in zip(supertype.paramTypes, subtype.paramTypes):
+                check_subtype(super_param, sub_param)
+            check_subtype(subtype.returnType, supertype.returnType)
+        case Stella.TypeRecordContext():
+            sub_fields = field_types_by_label(subtype)
+            for label, super_field in field_types_by_label(supertype).items():
+                if label not in sub_fields:
+                    raise MissingRecordFieldsError
+                check_subtype(sub_fields[label], super_field)
+        case Stella.TypeVariantContext():
+            super_fields = field_types_by_label(supertype)
+            for label, sub_field in field_types_by_label(subtype).items():
+                if label not in super_fields:
+                    raise UnexpectedVariantLabelError(label)
+                super_field = super_fields[label]
+                if (sub_field is None) != (super_field is None):
+                    raise UnexpectedSubtypeError(format_type(supertype), format_type(subtype))
+                if sub_field is not None:
+                    check_subtype(sub_field, super_field)
+        case Stella.TypeSumContext():
+            check_subtype(subtype.left, supertype.left)
+            check_subtype(subtype.right, supertype.right)
+        case Stella.TypeTupleContext():
+            if len(supertype.types) != len(subtype.types):
+                raise UnexpectedTupleLengthError(len(supertype.types), len(subtype.types))
+            for sub_element, super_element in zip(subtype.types, supertype.types):
+                check_subtype(sub_element, super_element)
+        case Stella.TypeListContext():
+            check_subtype(subtype.type_, supertype.type_)
+        case Stella.TypeRefContext():
+            check_subtype(subtype.type_, supertype.type_)
+            check_subtype(supertype.type_, subtype.type_)
+        case Stella.TypeVarContext():
+            if subtype.name.text != supertype.name.text:
+                raise UnexpectedSubtypeError(format_type(supertype), format_type(subtype))
+        case Stella.TypeForAllContext():
+            if len(supertype.types) != len(subtype.types):
+                raise UnexpectedSubtypeError(format_type(supertype), format_type(subtype))
+            renamed_subtype = substitute(subtype.type_, {
+                sub_name.text: type_variable(super_name.text, supertype.parser)
+                for super_name, sub_name in zip(supertype.types, subtype.types)
+            })
+            check_subtype(renamed_subtype, supertype.type_)
+        case Stella.TypeRecContext():
+            renamed_subtype = substitute(subtype.type_, {
+                subtype.var.text: type_variable(supertype.var.text, supertype.parser)
+            })
+            check_subtype(renamed_subtype, supertype.type_)
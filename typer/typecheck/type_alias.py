@@ -0,0 +1,112 @@
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import active_checker_state
+from typer.typecheck.type_error import CyclicTypeAliasError
+
+_NOT_AN_ALIAS = None
+
+
+def collect_type_aliases(declarations: list[Stella.DeclContext]) -> dict[str, Stella.StellatypeContext]:
+    aliases = {decl.name.text: decl.atype for decl in declarations if isinstance(decl, Stella.DeclTypeAliasContext)}
+    _check_alias_cycles(aliases)
+    return aliases
+
+
+def _check_alias_cycles(aliases: dict[str, Stella.StellatypeContext]):
+    # Each alias body is walked once; an alias reached again while its own body is being walked is cyclic.
+    # References under a binder of the same name (forall or µ) are type variables, not aliases.
+    done, in_progress = set(), set()
+
+    def visit(name: str):
+        if name in done:
+            return
+        if name in in_progress:
+            raise CyclicTypeAliasError(name)
+        in_progress.add(name)
+        for referenced in _alias_references(aliases[name], aliases, frozenset()):
+            visit(referenced)
+        in_progress.discard(name)
+        done.add(name)
+
+    for alias_name in aliases:
+        visit(alias_name)
+
+
+def _alias_references(stella_type: Stella.StellatypeContext, aliases: dict, bound: frozenset):
+    match stella_type:
+        case None:
+            return
+        case Stella.TypeVarContext():
+            if stella_type.name.text in aliases and stella_type.name.text not in bound:
+                yield stella_type.name.text
+        case Stella.TypeForAllContext():
+            yield from _alias_references(stella_type.type_, aliases, bound | {t.text for t in stella_type.types})
+        case Stella.TypeRecContext():
+            yield from _alias_references(stella_type.type_, aliases, bound | {stella_type.var.text})
+        case Stella.TypeFunContext():
+            for param_type in stella_type.paramTypes:
+                yield from _alias_references(param_type, aliases, bound)
+            yield from _alias_references(stella_type.returnType, aliases, bound)
+        case Stella.TypeSumContext():
+            yield from _alias_references(stella_type.left, aliases, bound)
+            yield from _alias_references(stella_type.right, aliases, bound)
+        case Stella.TypeTupleContext():
+            for element_type in stella_type.types:
+                yield from _alias_references(element_type, aliases, bound)
+        case Stella.TypeRecordContext() | Stella.TypeVariantContext():
+            for field in stella_type.fieldTypes:
+                yield from _alias_references(field.type_, aliases, bound)
+        case Stella.TypeListContext() | Stella.TypeRefContext() | Stella.TypeParensContext():
+            yield from _alias_references(stella_type.type_, aliases, bound)
+
+
+def expand_type_alias(type_var: Stella.TypeVarContext) -> Stella.StellatypeContext | None:
+    """Aliased type for a type variable naming an alias, None otherwise.
+
+    The expansion is looked up once per type node and remembered on it, and each alias is expanded once per program
+    (following chains of aliases), so comparisons see the aliased type without re-expanding it.
+    """
+    try:
+        return type_var.alias_expansion
+    except AttributeError:
+        pass
+    state = active_checker_state()
+    if state is None:
+        return _NOT_AN_ALIAS
+
+    name = type_var.name.text
+    if name not in state.type_aliases:
+        expansion = _NOT_AN_ALIAS
+    elif enclosing_binder(type_var) is not None:
+        # A type parameter shadowing the alias; not remembered, as copies of the node may sit under other binders
+        return _NOT_AN_ALIAS
+    elif name in state.alias_expansions:
+        expansion = state.alias_expansions[name]
+    else:
+        expansion = state.type_aliases[name]
+        while isinstance(expansion, Stella.TypeParensContext):
+            expansion = expansion.type_
+        if isinstance(expansion, Stella.TypeVarContext):
+            expansion = expand_type_alias(expansion) or expansion
+        state.alias_expansions[name] = expansion
+    type_var.alias_expansion = expansion
+    return expansion
+
+
+def enclosing_binder(type_var: Stella.TypeVarContext):
+    """The nearest forall, µ, generic function or type abstraction around the node that binds its name, if any."""
+    name = type_var.name.text
+    node = type_var.parentCtx
+    while node is not None:
+        match node:
+            case Stella.TypeForAllContext():
+                bound = node.types
+            case Stella.DeclFunGenericContext() | Stella.TypeAbstractionContext():
+                bound = node.generics
+            case Stella.TypeRecContext():
+                bound = [node.var]
+            case _:
+                bound = ()
+        if any(token.text == name for token in bound):
+            return node
+        node = node.parentCtx
+    return None
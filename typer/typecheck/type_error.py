@@ -1,9 +1,47 @@
+from typing import NamedTuple
+
+from antlr4 import ParserRuleContext
+
 from typer.grammar.stellaParser import stellaParser as Stella
 
 
+class Span(NamedTuple):
+    start_line: int
+    start_column: int
+    end_line: int
+    end_column: int
+
+    @classmethod
+    def of(cls, ctx: ParserRuleContext) -> 'Span':
+        start, stop = ctx.start, ctx.stop or ctx.start
+        return cls(start.line, start.column, stop.line, stop.column + len(stop.text or ""))
+
+
 class StellaTypeError(Exception):
     def __init__(self, message: str) -> None:
         self.message = message
+        self.span: Span | None = None
+
+    @property
+    def code(self) -> str:
+        return self.message.split(maxsplit=1)[0]
+
+
+class ParseError(StellaTypeError):
+    def __init__(self, line: int, column: int, message: str, length: int = 1) -> None:
+        super().__init__(f"ERROR_PARSE\n{line}:{column + 1}: {message}")
+        self.span = Span(line, column, line, column + length)
+
+
+class UnsupportedExpressionError(StellaTypeError):
+    def __init__(self, expression) -> None:
+        kind = type(expression).__name__.removesuffix("Context")
+        if expression.start is None or expression.stop is None:
+            super().__init__(f"ERROR_UNSUPPORTED_EXPRESSION\n{kind}")
+            return
+        text = expression.start.getInputStream().getText(expression.start.start, expression.stop.stop)
+        super().__init__(f"ERROR_UNSUPPORTED_EXPRESSION\n{kind}: {text}")
+        self.span = Span.of(expression)
 
 
 class MissingMainError(StellaTypeError):
@@ -86,6 +124,16 @@ class UnexpectedVariantLabelError(StellaTypeError):
         super().__init__(f"ERROR_UNEXPECTED_VARIANT_LABEL {label}")
 
 
+class UnexpectedDataForNullaryLabelError(StellaTypeError):
+    def __init__(self, label) -> None:
+        super().__init__(f"ERROR_UNEXPECTED_DATA_FOR_NULLARY_LABEL\n{label}")
+
+
+class MissingDataForLabelError(StellaTypeError):
+    def __init__(self, label) -> None:
+        super().__init__(f"ERROR_MISSING_DATA_FOR_LABEL\n{label}")
+
+
 class NotRecordError(StellaTypeError):
     def __init__(self) -> None:
         super().__init__("ERROR_NOT_A_RECORD")
@@ -139,3 +187,93 @@ class NonExhaustiveMatchError(StellaTypeError):
 class UnexpectedPatternForTypeError(StellaTypeError):
     def __init__(self, pattern, match_type) -> None:
         super().__init__(f"ERROR_UNEXPECTED_PATTERN_FOR_TYPE\nPattern: {pattern}\nMatch expression type: {match_type}")
+
+
+class UnreachablePatternError(StellaTypeError):
+    def __init__(self, pattern) -> None:
+        super().__init__(f"ERROR_UNREACHABLE_PATTERN\n{pattern}")
+
+
+class OccursCheckInfiniteTypeError(StellaTypeError):
+    def __init__(self, type_variable) -> None:
+        super().__init__(f"ERROR_OCCURS_CHECK_INFINITE_TYPE\n{type_variable}")
+
+
+class AmbiguousPatternTypeError(StellaTypeError):
+    def __init__(self, pattern) -> None:
+        super().__init__(f"ERROR_AMBIGUOUS_PATTERN_TYPE\n{pattern}")
+
+
+class NotGenericFunctionError(StellaTypeError):
+    def __init__(self, actual) -> None:
+        super().__init__(f"ERROR_NOT_A_GENERIC_FUNCTION\n{actual}")
+
+
+class IncorrectNumberOfTypeArgumentsError(StellaTypeError):
+    def __init__(self, expected_number: int, actual_number: int) -> None:
+        super().__init__(
+            f"ERROR_INCORRECT_NUMBER_OF_TYPE_ARGUMENTS\nExpected: {expected_number}\nActual: {actual_number}")
+
+
+class CyclicTypeAliasError(StellaTypeError):
+    def __init__(self, alias) -> None:
+        super().__init__(f"ERROR_CYCLIC_TYPE_ALIAS\n{alias}")
+
+
+class NotRecursiveTypeError(StellaTypeError):
+    def __init__(self, actual) -> None:
+        super().__init__(f"ERROR_NOT_A_RECURSIVE_TYPE\n{actual}")
+
+
+class NotReferenceError(StellaTypeError):
+    def __init__(self, actual) -> None:
+        super().__init__(f"ERROR_NOT_A_REFERENCE\n{actual}")
+
+
+class UnexpectedReferenceError(StellaTypeError):
+    def __init__(self, expected_type) -> None:
+        super().__init__(f"ERROR_UNEXPECTED_REFERENCE\nGot reference while expecting {expected_type}")
+
+
+class UnexpectedMemoryAddressError(StellaTypeError):
+    def __init__(self, expected_type) -> None:
+        super().__init__(f"ERROR_UNEXPECTED_MEMORY_ADDRESS\nGot memory address while expecting {expected_type}")
+
+
+class AmbiguousReferenceTypeError(StellaTypeError):
+    def __init__(self) -> None:
+        super().__init__(f"ERROR_AMBIGUOUS_REFERENCE_TYPE")
+
+
+class ExceptionTypeNotDeclaredError(StellaTypeError):
+    def __init__(self) -> None:
+        super().__init__(f"ERROR_EXCEPTION_TYPE_NOT_DECLARED")
+
+
+class AmbiguousThrowTypeError(StellaTypeError):
+    def __init__(self) -> None:
+        super().__init__(f"ERROR_AMBIGUOUS_THROW_TYPE")
+
+
+class AmbiguousPanicTypeError(StellaTypeError):
+    def __init__(self) -> None:
+        super().__init__(f"ERROR_AMBIGUOUS_PANIC_TYPE")
+
+
+class UnexpectedSubtypeError(StellaTypeError):
+    def __init__(self, expected_type, actual_type) -> None:
+        super().__init__(f"ERROR_UNEXPECTED_SUBTYPE\nExpected: {expected_type}\nActual: {actual_type}")
+
+
+def type_mismatch_error(expected: Stella.StellatypeContext, actual: Stella.StellatypeContext) -> StellaTypeError:
+    match expected:
+        case Stella.TypeFunContext():
+            return UnexpectedLambdaError(actual)
+        case Stella.TypeTupleContext():
+            return UnexpectedTupleError(actual)
+        case Stella.TypeRecordContext():
+            return UnexpectedRecordError(actual)
+        case Stella.TypeListContext():
+            return UnexpectedListError(actual)
+        case _:
+            return UnexpectedTypeError(type(expected), type(actual))
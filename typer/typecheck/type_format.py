@@ -0,0 +1,52 @@
+from typer.grammar.stellaParser import stellaParser as Stella
+
+
+def format_type(stella_type: Stella.StellatypeContext, _visiting: frozenset = frozenset()) -> str:
+    """Stella syntax for a type, including types synthesized by the checker that have no source text."""
+    if stella_type is None:
+        return "?"
+    if id(stella_type) in _visiting:
+        return "..."
+    visiting = _visiting | {id(stella_type)}
+    match stella_type:
+        case Stella.TypeParensContext():
+            return format_type(stella_type.type_, visiting)
+        case Stella.TypeNatContext():
+            return "Nat"
+        case Stella.TypeBoolContext():
+            return "Bool"
+        case Stella.TypeUnitContext():
+            return "Unit"
+        case Stella.TypeTopContext():
+            return "Top"
+        case Stella.TypeBottomContext():
+            return "Bot"
+        case Stella.TypeVarContext():
+            return stella_type.name.text
+        case Stella.TypeFunContext():
+            params = ", ".join(format_type(param, visiting) for param in stella_type.paramTypes)
+            return f"fn({params}) -> {format_type(stella_type.returnType, visiting)}"
+        case Stella.TypeSumContext():
+            return f"({format_type(stella_type.left, visiting)} + {format_type(stella_type.right, visiting)})"
+        case Stella.TypeTupleContext():
+            return "{" + ", ".join(format_type(t, visiting) for t in stella_type.types) + "}"
+        case Stella.TypeRecordContext():
+            return "{" + ", ".join(f"{field.label.text} : {format_type(field.type_, visiting)}"
+                                   for field in stella_type.fieldTypes) + "}"
+        case Stella.TypeVariantContext():
+            return "<|" + ", ".join(field.label.text + (f" : {format_type(field.type_, visiting)}" if field.type_ else "")
+                                    for field in stella_type.fieldTypes) + "|>"
+        case Stella.TypeListContext():
+            return f"[{format_type(stella_type.type_, visiting)}]"
+        case Stella.TypeRefContext():
+            return f"&{format_type(stella_type.type_, visiting)}"
+        case Stella.TypeForAllContext():
+            return f"forall {' '.join(t.text for t in stella_type.types)}. {format_type(stella_type.type_, visiting)}"
+        case Stella.TypeRecContext():
+            return f"µ{stella_type.var.text}. {format_type(stella_type.type_, visiting)}"
+        case _:
+            # Type variables of reconstruction print as their solution when they have one
+            bound_type = getattr(stella_type, "bound_type", None)
+            if bound_type is not None and bound_type() is not None:
+                return format_type(bound_type(), visiting)
+            return stella_type.getText()
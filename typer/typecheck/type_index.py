@@ -0,0 +1,60 @@
+from array import array
+from bisect import bisect_right
+from typing import NamedTuple
+
+from typer.grammar.stellaParser import stellaParser as Stella
+
+
+class TypedInterval(NamedTuple):
+    start: int
+    stop: int
+    type: Stella.StellatypeContext
+
+
+class TypeIndex:
+    """Types inferred for the expressions of a checked program, keyed by the character interval of their tokens.
+
+    Expression intervals nest like the tree they come from, so they cut the source into elementary pieces, each
+    covered by the same innermost expression throughout. The index keeps the start offset of every piece and the
+    expression covering it in two arrays, and answers a query with a single bisection."""
+
+    def __init__(self, records: list[tuple[int, int, Stella.StellatypeContext]]):
+        # Recorded when each expression has been checked, so an expression comes after the expressions inside it.
+        # Among expressions with the same interval the innermost is the one to report, so it is pushed last.
+        order = sorted(range(len(records)), key=lambda i: (records[i][0], -records[i][1], -i))
+        self.starts = array("q", (records[i][0] for i in order))
+        self.stops = array("q", (records[i][1] for i in order))
+        self.types = [records[i][2] for i in order]
+        self.piece_starts = array("q")
+        self.piece_owners = array("q")
+
+        enclosing = []
+        for i, start in enumerate(self.starts):
+            while enclosing and self.stops[enclosing[-1]] < start:
+                self._start_piece(self.stops[enclosing.pop()] + 1, enclosing[-1] if enclosing else -1)
+            self._start_piece(start, i)
+            enclosing.append(i)
+        while enclosing:
+            self._start_piece(self.stops[enclosing.pop()] + 1, enclosing[-1] if enclosing else -1)
+
+    def _start_piece(self, start: int, owner: int):
+        if self.piece_starts and self.piece_starts[-1] == start:
+            self.piece_owners[-1] = owner
+        else:
+            self.piece_starts.append(start)
+            self.piece_owners.append(owner)
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+    def at(self, offset: int) -> TypedInterval | None:
+        """The innermost expression whose tokens cover the character offset, with its type."""
+        piece = bisect_right(self.piece_starts, offset) - 1
+        if piece < 0 or self.piece_owners[piece] < 0:
+            return None
+        owner = self.piece_owners[piece]
+        return TypedInterval(self.starts[owner], self.stops[owner], self.types[owner])
+
+    def type_at(self, offset: int) -> Stella.StellatypeContext | None:
+        interval = self.at(offset)
+        return interval.type if interval else None
@@ -1,6 +1,6 @@
-import copy
+from typing import Dict, Optional
 
-from typing import List, Dict
+from antlr4.Token import Token
 
 from typer.grammar.stellaParser import stellaParser
 
@@ -8,26 +8,38 @@ from typer.typecheck.type_error import UndefinedVarError
 
 
 class TypeMap:
-    def __init__(self):
-        self.__context: List[Dict[stellaParser.StellaIdent, stellaParser.StellatypeContext]] = [dict()]
+    """A scope of name bindings. Nested scopes link to their enclosing scope instead of copying it, so opening a
+    scope costs O(1) and a lookup walks outwards through the enclosing scopes."""
+
+    def __init__(self, parent: Optional['TypeMap'] = None):
+        self.__bindings: Dict[str, tuple[stellaParser.StellatypeContext, Token]] = dict()
+        self.__parent = parent
 
     def insert(self, token: stellaParser.StellaIdent, ctx: stellaParser.StellatypeContext):
-        self.__context[-1][token] = ctx
+        self.__bindings[token.text] = (ctx, token)
 
     def find(self, token: stellaParser.StellaIdent):
-        for context in self.__context[::-1]:
-            for ident, ident_type in context.items():
-                if token.text == ident.text:
-                    return ident_type
-        raise UndefinedVarError(token.text)
+        return self.lookup(token)[0]
+
+    def lookup(self, token: stellaParser.StellaIdent) -> tuple[stellaParser.StellatypeContext, Token]:
+        """Type of a name together with the token that bound it."""
+        name = token.text
+        scope = self
+        while scope is not None:
+            bindings = scope.__bindings
+            if name in bindings:
+                return bindings[name]
+            scope = scope.__parent
+        raise UndefinedVarError(name)
 
     @property
     def context(self):
-        return self.__context
+        scopes = []
+        scope = self
+        while scope is not None:
+            scopes.append(scope.__bindings)
+            scope = scope.__parent
+        return scopes[::-1]
 
     def nested_scope(self) -> 'TypeMap':
-        new_context = TypeMap()
-        new_context.__context = [dict() for _ in range(len(self.__context) + 1)]
-        for i in range(len(self.__context)):
-            new_context.__context[i] = copy.copy(self.__context[i])
-        return new_context
+        return TypeMap(self)
@@ -0,0 +1,50 @@
+from typing import NamedTuple
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import checker_state
+from typer.typecheck.type_error import OccursCheckInfiniteTypeError
+from typer.typecheck.type_format import format_type
+from typer.typecheck.type_transform import map_type
+from typer.typecheck.unify import TypeVariableContext, fresh_type_variable, find, type_children
+
+
+class TypeScheme(NamedTuple):
+    quantified: tuple[TypeVariableContext, ...]
+    type_: Stella.StellatypeContext
+
+
+def generalize(stella_type: Stella.StellatypeContext) -> Stella.StellatypeContext | TypeScheme:
+    """Quantifies the variables created deeper than the current let level. Their levels say they are not reachable
+    from the enclosing environment, so only the type itself is walked."""
+    level = checker_state().current_level
+    quantified, visited, on_path = {}, set(), set()
+
+    def walk(node):
+        if isinstance(node, TypeVariableContext):
+            node = find(node)
+            if node.instance is None:
+                if node.level > level:
+                    quantified[id(node)] = node
+                return
+        if id(node) in on_path:
+            raise OccursCheckInfiniteTypeError(format_type(stella_type))
+        if id(node) in visited:
+            return
+        visited.add(id(node))
+        on_path.add(id(node))
+        for child in type_children(node):
+            walk(child)
+        on_path.discard(id(node))
+
+    walk(stella_type)
+    if not quantified:
+        return stella_type
+    return TypeScheme(tuple(quantified.values()), stella_type)
+
+
+def instantiate(binding: Stella.StellatypeContext | TypeScheme) -> Stella.StellatypeContext:
+    if not isinstance(binding, TypeScheme):
+        return binding
+    fresh_variables = {id(type_variable): fresh_type_variable() for type_variable in binding.quantified}
+    return map_type(binding.type_,
+                    lambda node: fresh_variables.get(id(node)) if isinstance(node, TypeVariableContext) else None)
@@ -0,0 +1,72 @@
+from typing import Callable
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.unify import resolve
+
+TypeTransform = Callable[[Stella.StellatypeContext], Stella.StellatypeContext | None]
+
+
+def map_type(stella_type: Stella.StellatypeContext, transform: TypeTransform) -> Stella.StellatypeContext:
+    """Copies a type, replacing every node for which transform returns a type. Subtrees without replacements are
+    shared with the original rather than copied, so the cost is bounded by the part of the type that changes."""
+    if stella_type is None:
+        return None
+    stella_type = resolve(stella_type)
+    replacement = transform(stella_type)
+    if replacement is not None:
+        return replacement
+
+    match stella_type:
+        case Stella.TypeFunContext():
+            param_types = [map_type(param, transform) for param in stella_type.paramTypes]
+            return_type = map_type(stella_type.returnType, transform)
+            if _unchanged(stella_type.paramTypes + [stella_type.returnType], param_types + [return_type]):
+                return stella_type
+            result = Stella.TypeFunContext(stella_type.parser, stella_type)
+            result.paramTypes, result.returnType = param_types, return_type
+            return result
+        case Stella.TypeSumContext():
+            left, right = map_type(stella_type.left, transform), map_type(stella_type.right, transform)
+            if _unchanged([stella_type.left, stella_type.right], [left, right]):
+                return stella_type
+            result = Stella.TypeSumContext(stella_type.parser, stella_type)
+            result.left, result.right = left, right
+            return result
+        case Stella.TypeTupleContext():
+            types = [map_type(t, transform) for t in stella_type.types]
+            if _unchanged(stella_type.types, types):
+                return stella_type
+            result = Stella.TypeTupleContext(stella_type.parser, stella_type)
+            result.types = types
+            return result
+        case Stella.TypeRecordContext() | Stella.TypeVariantContext():
+            field_types = [map_type(field.type_, transform) for field in stella_type.fieldTypes]
+            if _unchanged([field.type_ for field in stella_type.fieldTypes], field_types):
+                return stella_type
+            result = type(stella_type)(stella_type.parser, stella_type)
+            result.fieldTypes = [_copy_field(field, field_type)
+                                 for field, field_type in zip(stella_type.fieldTypes, field_types)]
+            return result
+        case Stella.TypeListContext() | Stella.TypeRefContext() | Stella.TypeForAllContext() | Stella.TypeRecContext():
+            inner_type = map_type(stella_type.type_, transform)
+            if inner_type is stella_type.type_:
+                return stella_type
+            result = type(stella_type)(stella_type.parser, stella_type)
+            result.type_ = inner_type
+            if isinstance(stella_type, Stella.TypeForAllContext):
+                result.types = stella_type.types
+            if isinstance(stella_type, Stella.TypeRecContext):
+                result.var = stella_type.var
+            return result
+        case _:
+            return stella_type
+
+
+def _unchanged(original: list, mapped: list) -> bool:
+    return all(a is b for a, b in zip(original, mapped))
+
+
+def _copy_field(field, field_type: Stella.StellatypeContext):
+    result = type(field)(field.parser, field.parentCtx)
+    result.label, result.type_ = field.label, field_type
+    return result
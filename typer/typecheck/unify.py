@@ -0,0 +1,206 @@
+import itertools
+
+from typer.grammar.stellaParser import stellaParser as Stella
+from typer.typecheck.checker_state import checker_state
+from typer.typecheck.type_error import UnexpectedTypeError, OccursCheckInfiniteTypeError
+from typer.typecheck.type_format import format_type
+from typer.typecheck.type_alias import expand_type_alias
+
+_variable_ids = itertools.count()
+
+
+class TypeVariableContext(Stella.StellatypeContext):
+    """Type variable introduced by type reconstruction, a node of the union-find forest."""
+
+    def __init__(self, level: int = 0):
+        super().__init__(None)
+        self.name = f"?T{next(_variable_ids)}"
+        self.representative: TypeVariableContext = self
+        self.rank = 0
+        self.level = level
+        self.instance: Stella.StellatypeContext | None = None
+
+    def bound_type(self) -> Stella.StellatypeContext | None:
+        return find(self).instance
+
+    def getText(self):
+        return find(self).name
+
+
+def fresh_type_variable() -> TypeVariableContext:
+    state = checker_state()
+    type_variable = TypeVariableContext(state.current_level)
+    state.type_variables.append(type_variable)
+    return type_variable
+
+
+def find(type_variable: TypeVariableContext) -> TypeVariableContext:
+    root = type_variable
+    while root.representative is not root:
+        root = root.representative
+    while type_variable is not root:
+        type_variable.representative, type_variable = root, type_variable.representative
+    return root
+
+
+def resolve(stella_type: Stella.StellatypeContext) -> Stella.StellatypeContext:
+    """Strips parentheses, expands type aliases and replaces bound type variables with their instances."""
+    while True:
+        if isinstance(stella_type, Stella.TypeParensContext):
+            stella_type = stella_type.type_
+        elif isinstance(stella_type, Stella.TypeVarContext):
+            expansion = expand_type_alias(stella_type)
+            if expansion is None:
+                return stella_type
+            stella_type = expansion
+        elif isinstance(stella_type, TypeVariableContext):
+            root = find(stella_type)
+            if root.instance is None:
+                return root
+            stella_type = root.instance
+        else:
+            return stella_type
+
+
+def is_unbound(stella_type: Stella.StellatypeContext) -> bool:
+    return isinstance(resolve(stella_type), TypeVariableContext)
+
+
+def _union(left: TypeVariableContext, right: TypeVariableContext):
+    if left.rank < right.rank:
+        left, right = right, left
+    right.representative = left
+    left.level = min(left.level, right.level)
+    if left.rank == right.rank:
+        left.rank += 1
+
+
+def _bind(type_variable: TypeVariableContext, stella_type: Stella.StellatypeContext, track_levels: bool):
+    type_variable.instance = stella_type
+    if track_levels:
+        _adjust_levels(stella_type, type_variable.level)
+
+
+def _adjust_levels(stella_type: Stella.StellatypeContext, level: int):
+    # Variables reachable from a type bound at some level may no longer be generalized below that level. Variables
+    # already at or below it were adjusted when they were bound themselves, so the walk stops there.
+    pending, visited = [stella_type], set()
+    while pending:
+        node = pending.pop()
+        if id(node) in visited:
+            continue
+        visited.add(id(node))
+        if isinstance(node, TypeVariableContext):
+            node = find(node)
+            if node.level <= level:
+                continue
+            node.level = level
+        pending.extend(type_children(node))
+
+
+def unify(expected: Stella.StellatypeContext, actual: Stella.StellatypeContext):
+    # Binding a variable does not walk the bound type: cycles are tolerated here (pairs already being unified are
+    # assumed equal) and rejected once for the whole program by check_acyclic
+    pending = [(expected, actual)]
+    assumed = set()
+    track_levels = checker_state().let_polymorphism
+    while pending:
+        expected, actual = pending.pop()
+        expected, actual = resolve(expected), resolve(actual)
+        if expected is actual:
+            continue
+        if isinstance(expected, TypeVariableContext) and isinstance(actual, TypeVariableContext):
+            _union(expected, actual)
+            continue
+        if isinstance(expected, TypeVariableContext):
+            _bind(expected, actual, track_levels)
+            continue
+        if isinstance(actual, TypeVariableContext):
+            _bind(actual, expected, track_levels)
+            continue
+        if (id(expected), id(actual)) in assumed:
+            continue
+        assumed.add((id(expected), id(actual)))
+        pending.extend(type_argument_pairs(expected, actual))
+
+
+def type_argument_pairs(expected: Stella.StellatypeContext, actual: Stella.StellatypeContext) -> list:
+    if type(expected) is not type(actual):
+        raise UnexpectedTypeError(format_type(expected), format_type(actual))
+    match expected:
+        case Stella.TypeFunContext():
+            if len(expected.paramTypes) != len(actual.paramTypes):
+                raise UnexpectedTypeError(format_type(expected), format_type(actual))
+            return list(zip(expected.paramTypes, actual.paramTypes)) + [(expected.returnType, actual.returnType)]
+        case Stella.TypeSumContext():
+            return [(expected.left, actual.left), (expected.right, actual.right)]
+        case Stella.TypeListContext() | Stella.TypeRefContext():
+            return [(expected.type_, actual.type_)]
+        case Stella.TypeTupleContext():
+            if len(expected.types) != len(actual.types):
+                raise UnexpectedTypeError(format_type(expected), format_type(actual))
+            return list(zip(expected.types, actual.types))
+        case Stella.TypeRecordContext() | Stella.TypeVariantContext():
+            expected_fields = {field.label.text: field.type_ for field in expected.fieldTypes}
+            actual_fields = {field.label.text: field.type_ for field in actual.fieldTypes}
+            if expected_fields.keys() != actual_fields.keys():
+                raise UnexpectedTypeError(format_type(expected), format_type(actual))
+            arguments = []
+            for label, expected_field in expected_fields.items():
+                actual_field = actual_fields[label]
+                if (expected_field is None) != (actual_field is None):
+                    raise UnexpectedTypeError(format_type(expected), format_type(actual))
+                if expected_field is not None:
+                    arguments.append((expected_field, actual_field))
+            return arguments
+        case Stella.TypeVarContext():
+            if expected.name.text != actual.name.text:
+                raise UnexpectedTypeError(format_type(expected), format_type(actual))
+            return []
+        case _:
+            return []
+
+
+def type_children(stella_type: Stella.StellatypeContext) -> list:
+    match stella_type:
+        case Stella.TypeFunContext():
+            return [*stella_type.paramTypes, stella_type.returnType]
+        case Stella.TypeSumContext():
+            return [stella_type.left, stella_type.right]
+        case Stella.TypeListContext() | Stella.TypeRefContext() | Stella.TypeParensContext():
+            return [stella_type.type_]
+        case Stella.TypeTupleContext():
+            return list(stella_type.types)
+        case Stella.TypeRecordContext() | Stella.TypeVariantContext():
+            return [field.type_ for field in stella_type.fieldTypes if field.type_ is not None]
+        case TypeVariableContext():
+            root = find(stella_type)
+            return [root.instance] if root.instance is not None else []
+        case _:
+            return []
+
+
+def check_acyclic(type_variables: list[TypeVariableContext]):
+    """Deferred occurs check: one depth-first walk over every solved variable, each type node visited once."""
+    in_progress, done = set(), set()
+    for type_variable in type_variables:
+        root = find(type_variable)
+        if id(root) in done:
+            continue
+        stack = [(root, iter(type_children(root)))]
+        in_progress.add(id(root))
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                stack.pop()
+                in_progress.discard(id(node))
+                done.add(id(node))
+                continue
+            if isinstance(child, TypeVariableContext):
+                child = find(child)
+            if id(child) in in_progress:
+                raise OccursCheckInfiniteTypeError(format_type(type_variable))
+            if id(child) not in done:
+                in_progress.add(id(child))
+                stack.append((child, iter(type_children(child))))